@@ -2,21 +2,189 @@ from OpenGL.GL import *
 from OpenGL.GLUT import *
 from OpenGL.GLU import *
 
+import os
+import sys
+import json
 import time
 import random
+import struct
+import zlib
+from itertools import islice
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
 
 width = 800
 height = 600
 diamond_size = 15
 catcher_h = 90
 catcher_w = 15
+diamond_colors = [(1, 0, 0), (0, 1, 0), (0, 0, 1), (1, 1, 0), (1, 0, 1), (0, 1, 1)]
+
+# Point Batch
+# every point of a frame is collected here and sent to GL in one draw call
+class PointBatch:
+    primitive = GL_POINTS
+
+    def __init__(self, capacity=4096):
+        self.points = np.zeros((capacity, 2), dtype=np.float32)
+        self.colors = np.zeros((capacity, 3), dtype=np.float32)
+        self.count = 0
+        self.color = (1, 1, 1)
+        self.spans = None  # SpanBatch, made on the first add_spans()
+
+    def reserve(self, extra):
+        needed = self.count + extra
+        if needed > len(self.points):
+            capacity = max(needed, 2 * len(self.points))
+            points = np.zeros((capacity, 2), dtype=np.float32)
+            colors = np.zeros((capacity, 3), dtype=np.float32)
+            points[:self.count] = self.points[:self.count]
+            colors[:self.count] = self.colors[:self.count]
+            self.points, self.colors = points, colors
+
+    def add(self, x, y):
+        if self.count == len(self.points):
+            self.reserve(1)
+        self.points[self.count] = x, y
+        self.colors[self.count] = self.color
+        self.count += 1
+
+    def add_pixels(self, pixels):
+        n = len(pixels)
+        self.reserve(n)
+        self.points[self.count:self.count + n] = pixels
+        self.colors[self.count:self.count + n] = self.color
+        self.count += n
+
+    def add_spans(self, spans):
+        if self.spans is None:
+            self.spans = SpanBatch()
+        self.spans.color = self.color
+        self.spans.add_pixels(span_quads(spans))
+
+    def clear(self):
+        glClear(GL_COLOR_BUFFER_BIT)
+        self.count = 0
+        if self.spans is not None:
+            self.spans.count = 0
+
+    def flush(self):
+        if self.count:
+            glPointSize(2)
+            glEnableClientState(GL_VERTEX_ARRAY)
+            glEnableClientState(GL_COLOR_ARRAY)
+            glVertexPointer(2, GL_FLOAT, 0, self.points)
+            glColorPointer(3, GL_FLOAT, 0, self.colors)
+            glDrawArrays(self.primitive, 0, self.count)
+            glDisableClientState(GL_COLOR_ARRAY)
+            glDisableClientState(GL_VERTEX_ARRAY)
+        self.count = 0
+        if self.spans is not None:
+            self.spans.flush()
+
+class SpanBatch(PointBatch):
+    # one GL_QUADS rectangle per span, 4 vertices each
+    primitive = GL_QUADS
+
+def span_quads(spans):
+    # The union of the size 2 points of a span is the rectangle from
+    # one below its lowest pixel to one above its highest, in both axes.
+    spans = np.asarray(spans).reshape(-1, 4)
+    x_low = np.minimum(spans[:, 0], spans[:, 2]) - 1
+    x_high = np.maximum(spans[:, 0], spans[:, 2]) + 1
+    y_low = np.minimum(spans[:, 1], spans[:, 3]) - 1
+    y_high = np.maximum(spans[:, 1], spans[:, 3]) + 1
+    corners = np.stack([x_low, y_low, x_high, y_low, x_high, y_high, x_low, y_high], axis=1)
+    return corners.reshape(-1, 2)
+
+def span_pixels(spans):
+    # every pixel covered by each span, in order
+    spans = np.asarray(spans).astype(np.int64).reshape(-1, 4)
+    step = np.sign(spans[:, 2:] - spans[:, :2])
+    counts = np.abs(spans[:, 2:] - spans[:, :2]).max(axis=1) + 1
+    starts = np.cumsum(counts) - counts
+    span = np.repeat(np.arange(len(spans)), counts)
+    i = np.arange(counts.sum()) - starts[span]
+    return spans[span, :2] + step[span] * i[:, None]
+
+# Framebuffer
+# headless render target, a uint8 RGB image with row 0 at the bottom like GL
+class Framebuffer:
+    def __init__(self, width, height, clear_color=(0, 0, 0), channels=3):
+        self.width = width
+        self.height = height
+        self.channels = channels  # 3 for RGB, 4 for RGBA with alpha 255
+        self.pixels = np.zeros((height, width, channels), dtype=np.uint8)
+        # a cleared frame kept around, copying it is much faster than
+        # broadcasting the clear color every frame
+        self.background = np.empty_like(self.pixels)
+        self.background[:] = self.pixel_value(clear_color)
+        self.color = (1, 1, 1)
+        self.clip = (0, 0, width, height)  # x0, y0, x1, y1 that may be written, ends excluded
+
+    def pixel_value(self, color):
+        return np.append(to_rgb8(color), 255)[:self.channels]
+
+    def add(self, x, y):
+        self.add_pixels(np.array([[x, y]]))
+
+    def add_pixels(self, pixels):
+        # a size 2 GL point at (x, y) covers pixels x - 1 .. x and y - 1 .. y
+        pixels = np.floor(np.asarray(pixels) - 0.5).astype(np.int64)
+        x = (pixels[:, 0, None] + (0, 1, 0, 1)).ravel()
+        y = (pixels[:, 1, None] + (0, 0, 1, 1)).ravel()
+        x0, y0, x1, y1 = self.clip
+        inside = (x >= x0) & (x < x1) & (y >= y0) & (y < y1)
+        flat = self.pixels.reshape(-1, self.channels)
+        flat[y[inside] * self.width + x[inside]] = self.pixel_value(self.color)
+
+    def add_spans(self, spans):
+        self.add_pixels(span_pixels(spans))
+
+    def clear(self):
+        np.copyto(self.pixels, self.background)
+
+    def flush(self):
+        pass
+
+    def save_ppm(self, path):
+        with open(path, 'wb') as f:
+            f.write(b'P6 %d %d 255\n' % (self.width, self.height))
+            f.write(self.pixels[::-1, :, :3].tobytes())
+
+    def save_png(self, path):
+        rows = np.zeros((self.height, 1 + self.width * 3), dtype=np.uint8)
+        rows[:, 1:] = self.pixels[::-1, :, :3].reshape(self.height, -1)  # filter byte 0 per row
+
+        def chunk(tag, data):
+            return (struct.pack('>I', len(data)) + tag + data +
+                    struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff))
+
+        with open(path, 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n')
+            f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', self.width, self.height, 8, 2, 0, 0, 0)))
+            f.write(chunk(b'IDAT', zlib.compress(rows.tobytes())))
+            f.write(chunk(b'IEND', b''))
+
+def to_rgb8(color):
+    # same float to byte conversion GL does for glColor3f
+    return (np.asarray(color, dtype=np.float64) * 255 + 0.5).astype(np.uint8)
+
+render_target = PointBatch()
+
+def set_render_target(target):
+    global render_target
+    render_target = target
+
+def set_color(r, g, b):
+    render_target.color = (r, g, b)
+
 
 # Midpoint Line Drawing & Eight-Way Symmetry 
 def draw_points(x, y):
-    glPointSize(2)
-    glBegin(GL_POINTS)
-    glVertex2f(x, y)
-    glEnd()
+    render_target.add(x, y)
 
 def find_zone(x0, y0, x1, y1):
     dx = x1 - x0
@@ -77,14 +245,17 @@ def convert_from_zone0(x, y, zone):
     elif zone == 7:
         return x, -y
 
-def midpoint(zone, x0, y0, x1, y1):
+def midpoint(zone, x0, y0, x1, y1, first=0, last=None):
+    # first/last limit the steps drawn, see clip_line()
     dx = x1 - x0
     dy = y1 - y0
-    d = (2 * dy) - dx
+    m = (2 * dy * first + dx - 1) // (2 * dx) if first else 0
+    d = 2 * dy * (first + 1) - dx * (2 * m + 1)
     E = 2 * dy
     NE = 2 * (dy - dx)
-    x, y = x0, y0
-    while x <= x1:
+    x, y = x0 + first, y0 + m
+    end = x1 if last is None else x0 + last
+    while x <= end:
         x_og, y_og = convert_from_zone0(x, y, zone)
         draw_points(x_og, y_og)
         if d <= 0:
@@ -99,10 +270,775 @@ def draw_line(x0, y0, x1, y1):
     zone = find_zone(x0, y0, x1, y1)
     x0_convert, y0_convert = convert_to_zone0(x0, y0, zone)
     x1_convert, y1_convert = convert_to_zone0(x1, y1, zone)
-    midpoint(zone, x0_convert, y0_convert, x1_convert, y1_convert)
+    steps = clip_line(x0, y0, x1, y1, zone)
+    if steps is None:
+        return
+    midpoint(zone, x0_convert, y0_convert, x1_convert, y1_convert, *steps)
+
+
+# Vectorized Midpoint Engine
+# zone by [steep, dx < 0, dy < 0], the same split find_zone makes
+ZONE_TABLE = np.array([[[0, 7], [3, 4]],
+                       [[1, 6], [2, 5]]])
+
+# convert_to_zone0 as 2x2 matrices, one per zone
+TO_ZONE0 = np.array([[[1, 0], [0, 1]],
+                     [[0, 1], [1, 0]],
+                     [[0, 1], [-1, 0]],
+                     [[-1, 0], [0, 1]],
+                     [[-1, 0], [0, -1]],
+                     [[0, -1], [-1, 0]],
+                     [[0, -1], [1, 0]],
+                     [[1, 0], [0, -1]]])
+# the matrices are orthogonal, so convert_from_zone0 is the transpose
+FROM_ZONE0 = TO_ZONE0.transpose(0, 2, 1)
+
+def find_zones(dx, dy):
+    steep = (np.abs(dx) < np.abs(dy)).astype(int)
+    return ZONE_TABLE[steep, (dx < 0).astype(int), (dy < 0).astype(int)]
+
+def prepare_lines(lines, window=None):
+    # start point, zone, zone 0 deltas and the range of steps midpoint()
+    # draws for each line of an (N, 4) array of integer x0, y0, x1, y1
+    lines = np.asarray(lines).astype(np.int64).reshape(-1, 4)
+    x0, y0, x1, y1 = lines.T
+    zone = find_zones(x1 - x0, y1 - y0)
+    to0 = TO_ZONE0[zone]
+    dx = to0[:, 0, 0] * (x1 - x0) + to0[:, 0, 1] * (y1 - y0)
+    dy = to0[:, 1, 0] * (x1 - x0) + to0[:, 1, 1] * (y1 - y0)
+    first = np.zeros_like(dx)
+    last = dx
+    if window is not None:
+        start_x = to0[:, 0, 0] * x0 + to0[:, 0, 1] * y0
+        start_y = to0[:, 1, 0] * x0 + to0[:, 1, 1] * y0
+        first, last = clip_steps(start_x, start_y, dx, dy, to0, window)
+        record_clip(dx + 1, np.maximum(last - first + 1, 0))
+    return x0, y0, zone, dx, dy, first, last
+
+# After k steps with m NE moves the decision variable is
+# d = 2*dy*(k + 1) - dx*(2*m + 1), and NE is taken while d > 0,
+# so m is dy*k/dx rounded with ties going down.
+def steps_to_m(k, dx, dy):
+    return np.maximum(2 * dy * k + dx - 1, 0) // np.maximum(2 * dx, 1)
+
+def m_to_steps(low_m, high_m, dx, dy):
+    # first step with m >= low_m and last step with m <= high_m
+    two_dy = np.maximum(2 * dy, 1)
+    first = np.where(low_m <= 0, 0, np.where(dy > 0, -((dx - 1 - 2 * dx * low_m) // two_dy), dx + 1))
+    last = np.where(high_m < 0, -1, np.where(dy > 0, (2 * dx * (high_m + 1) - dx) // two_dy, dx))
+    return first, last
+
+def from_zone0_steps(x0, y0, zone, k, m):
+    # pixel (k, m) of a line: start point + convert_from_zone0(k, m)
+    from0 = FROM_ZONE0[zone]
+    pixels = np.empty((len(k), 2), dtype=np.int64)
+    pixels[:, 0] = x0 + from0[:, 0, 0] * k + from0[:, 0, 1] * m
+    pixels[:, 1] = y0 + from0[:, 1, 0] * k + from0[:, 1, 1] * m
+    return pixels
+
+def midpoint_lines(lines, window=None):
+    # Returns every pixel of every line in draw_line order, plus the
+    # pixel count of each line. With a window only the pixels inside it
+    # are made, see clip_steps().
+    return steps_pixels(*prepare_lines(lines, window))
+
+def steps_pixels(x0, y0, zone, dx, dy, first, last):
+    # midpoint_lines() for lines from prepare_lines(): the pixels of steps
+    # first..last of every line, laid out back to back
+    counts = np.maximum(last - first + 1, 0)
+    starts = np.cumsum(counts) - counts
+    line = np.repeat(np.arange(len(counts)), counts)
+    k = np.arange(counts.sum()) - starts[line] + first[line]
+    m = steps_to_m(k, dx[line], dy[line])
+    return from_zone0_steps(x0[line], y0[line], zone[line], k, m), counts
+
+def midpoint_spans(lines, window=None):
+    # Same pixels as midpoint_lines(), as one x0, y0, x1, y1 span per run
+    # that shares a row (zones 0, 3, 4, 7) or a column (zones 1, 2, 5, 6).
+    # A run is every step with the same m.
+    x0, y0, zone, dx, dy, first, last = prepare_lines(lines, window)
+    m_first = steps_to_m(first, dx, dy)
+    m_last = steps_to_m(last, dx, dy)
+    counts = np.where(last >= first, m_last - m_first + 1, 0)
+    starts = np.cumsum(counts) - counts
+    line = np.repeat(np.arange(len(counts)), counts)
+    m = np.arange(counts.sum()) - starts[line] + m_first[line]
+    dx, dy = dx[line], dy[line]
+    k_first, k_last = m_to_steps(m, m, dx, dy)
+    k_first = np.maximum(k_first, first[line])
+    k_last = np.minimum(k_last, last[line])
+    x0, y0, zone = x0[line], y0[line], zone[line]
+    spans = np.empty((len(m), 4), dtype=np.int64)
+    spans[:, :2] = from_zone0_steps(x0, y0, zone, k_first, m)
+    spans[:, 2:] = from_zone0_steps(x0, y0, zone, k_last, m)
+    return spans, counts
+
+# Midpoint Circles & Ellipses
+# One octant (circle) or quadrant (ellipse) is stepped for every shape at
+# once, then mirrored with the zone matrices like convert_from_zone0.
+def mirror_points(points, shape, zones):
+    # points of zone 0 mirrored into each of zones, grouped by shape
+    order = np.argsort(shape, kind='stable')
+    points, shape = points[order], shape[order]
+    swapped = points[:, ::-1]
+    mirrored = np.empty((len(points), len(zones), 2), dtype=points.dtype)
+    for i, zone in enumerate(zones):
+        # every zone matrix is a swap and/or sign flips
+        from0 = FROM_ZONE0[zone]
+        source = points if from0[0, 0] else swapped
+        mirrored[:, i] = source * from0.sum(axis=1)
+    return mirrored.reshape(-1, 2), np.repeat(shape, len(zones))
+
+def midpoint_circles(centers, radii):
+    # Returns the pixels of every circle, grouped by circle, and the
+    # pixel count of each circle. A negative radius draws nothing.
+    centers = np.asarray(centers).astype(np.int64).reshape(-1, 2)
+    radii = np.asarray(radii).astype(np.int64).reshape(-1)
+    x = np.zeros_like(radii)
+    y = radii.copy()
+    d = 1 - radii
+    points, shape = [np.zeros((0, 2), dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+    active = x <= y
+    while active.any():
+        idx = np.flatnonzero(active)
+        # octant from (0, r) to the diagonal, stored as (y, x) so it is in zone 0
+        points.append(np.stack([y[idx], x[idx]], axis=1))
+        shape.append(idx)
+        step_y = d >= 0
+        d += np.where(step_y, 2 * (x - y) + 5, 2 * x + 3)
+        y -= step_y
+        x += 1
+        active = x <= y
+    points, shape = np.concatenate(points), np.concatenate(shape)
+    pixels, shape = mirror_points(points, shape, np.arange(8))
+    return pixels + centers[shape], np.bincount(shape, minlength=len(radii))
+
+def midpoint_ellipses(centers, radii):
+    # radii is (N, 2) of rx, ry. Same return as midpoint_circles(), and
+    # nothing for an ellipse with a negative radius. The decision
+    # variable is kept times 4 so it stays an integer.
+    centers = np.asarray(centers).astype(np.int64).reshape(-1, 2)
+    radii = np.asarray(radii).astype(np.int64).reshape(-1, 2)
+    radii = np.where((radii < 0).any(axis=1, keepdims=True), -1, radii)  # y < 0 never steps
+    rx2, ry2 = radii[:, 0] ** 2, radii[:, 1] ** 2
+    x = np.zeros(len(radii), dtype=np.int64)
+    y = radii[:, 1].copy()
+    d = 4 * ry2 - 4 * rx2 * y + rx2
+    slope_x = np.zeros_like(x)  # 2 * ry^2 * x
+    slope_y = 2 * rx2 * y  # 2 * rx^2 * y
+    region2 = np.zeros(len(radii), dtype=bool)
+    points, shape = [np.zeros((0, 2), dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+    while True:
+        # region 1 ends where the slope passes -1
+        switch = ~region2 & (slope_x >= slope_y)
+        d = np.where(switch, ry2 * (2 * x + 1) ** 2 + 4 * rx2 * (y - 1) ** 2 - 4 * rx2 * ry2, d)
+        region2 |= switch
+        active = ~region2 | (y >= 0)
+        if not active.any():
+            break
+        idx = np.flatnonzero(active)
+        points.append(np.stack([x[idx], y[idx]], axis=1))
+        shape.append(idx)
+        # region 1 steps x and sometimes y, region 2 steps y and sometimes x
+        step_x = active & (region2 <= (d <= 0))
+        step_y = active & (region2 | (d >= 0))
+        slope_x += 2 * ry2 * step_x
+        slope_y -= 2 * rx2 * step_y
+        d += np.where(region2,
+                      4 * (np.where(step_x, slope_x, 0) - slope_y + rx2),
+                      4 * (slope_x - np.where(step_y, slope_y, 0) + ry2))
+        x += step_x
+        y -= step_y
+    points, shape = np.concatenate(points), np.concatenate(shape)
+    pixels, shape = mirror_points(points, shape, np.array([0, 3, 4, 7]))
+    return pixels + centers[shape], np.bincount(shape, minlength=len(radii))
+
+def draw_circles(centers, radii):
+    pixels, _ = midpoint_circles(centers, radii)
+    render_target.add_pixels(pixels)
+
+def draw_ellipses(centers, radii):
+    pixels, _ = midpoint_ellipses(centers, radii)
+    render_target.add_pixels(pixels)
+
+
+span_output = False  # draw runs of pixels as spans instead of points
+
+def draw_lines(lines):
+    # returns the number of pixels drawn
+    if span_output:
+        spans, _ = midpoint_spans(lines, clip_window)
+        render_target.add_spans(spans)
+        return int((np.abs(spans[:, 2:] - spans[:, :2]).max(axis=1) + 1).sum())
+    pixels, _ = midpoint_lines(lines, clip_window)
+    render_target.add_pixels(pixels)
+    return len(pixels)
+
+
+# Line Clipping
+# Lines are clipped on the step index of midpoint() instead of by moving
+# their endpoints, so the pixels kept are exactly the visible pixels of
+# the whole line. Set clip_window to None to turn clipping off.
+clip_window = (0, 0, width, height)  # a size 2 point at x = width still covers column width - 1
+clip_stats = {'lines': 0, 'rejected': 0, 'pixels_saved': 0}
+
+INSIDE, LEFT, RIGHT, BOTTOM, TOP = 0, 1, 2, 4, 8
+
+def outcode(x, y, window):
+    xmin, ymin, xmax, ymax = window
+    code = INSIDE
+    if x < xmin:
+        code |= LEFT
+    elif x > xmax:
+        code |= RIGHT
+    if y < ymin:
+        code |= BOTTOM
+    elif y > ymax:
+        code |= TOP
+    return code
+
+def clip_steps(x0, y0, dx, dy, to0, window):
+    # Liang-Barsky on the step index k of midpoint() in zone 0, where
+    # pixel k is (x0 + k, y0 + m_k) and m_k = (2*dy*k + dx - 1) // (2*dx).
+    # Returns the first and last visible step; first > last means none.
+    xmin, ymin, xmax, ymax = window
+    wx = (to0[..., 0, 0] * xmin + to0[..., 0, 1] * ymin, to0[..., 0, 0] * xmax + to0[..., 0, 1] * ymax)
+    wy = (to0[..., 1, 0] * xmin + to0[..., 1, 1] * ymin, to0[..., 1, 0] * xmax + to0[..., 1, 1] * ymax)
+    k_low, k_high = m_to_steps(np.minimum(*wy) - y0, np.maximum(*wy) - y0, dx, dy)
+    first = np.maximum(np.maximum(np.minimum(*wx) - x0, k_low), 0)
+    last = np.minimum(np.minimum(np.maximum(*wx) - x0, k_high), dx)
+    return first, last
+
+def clip_line(x0, y0, x1, y1, zone):
+    # steps of midpoint() to draw for draw_line(), None if nothing is visible
+    if clip_window is None:
+        return 0, None
+    total = max(abs(x1 - x0), abs(y1 - y0)) + 1
+    off_grid = any(v != int(v) for v in (x0, y0, x1, y1))
+    window = clip_window
+    if off_grid:
+        # a size 2 point up to half a pixel past an edge still covers the
+        # pixels on it, so only lines a pixel past it are dropped
+        xmin, ymin, xmax, ymax = clip_window
+        window = (xmin - 1, ymin - 1, xmax + 1, ymax + 1)
+    code0 = outcode(x0, y0, window)
+    code1 = outcode(x1, y1, window)
+    if code0 & code1:  # both ends past the same edge
+        record_clip(total, 0)
+        return None
+    if not (code0 | code1) or off_grid:
+        # fully inside, or not on the pixel grid where clipping is exact
+        record_clip(total, total)
+        return 0, None
+    x0_convert, y0_convert = convert_to_zone0(x0, y0, zone)
+    x1_convert, y1_convert = convert_to_zone0(x1, y1, zone)
+    first, last = clip_steps(x0_convert, y0_convert, x1_convert - x0_convert,
+                             y1_convert - y0_convert, TO_ZONE0[zone], clip_window)
+    first, last = int(first), int(last)
+    record_clip(total, max(last - first + 1, 0))
+    if first > last:
+        return None
+    return first, last
+
+def record_clip(total, kept):
+    clip_stats['lines'] += np.size(total)
+    clip_stats['rejected'] += int(np.sum(kept == 0))
+    clip_stats['pixels_saved'] += int(np.sum(total - kept))
+
+def reset_clip_stats():
+    for key in clip_stats:
+        clip_stats[key] = 0
+
+
+# Offline Tiled Rasterizer
+# For big vector drawings rendered to an image instead of the window.
+# Lines are binned into square tiles and every tile rasterizes its lines
+# clipped to itself, so no two tiles write the same pixel and worker
+# processes can fill one shared image without locks.
+tile_size = 1024
+lines_per_pass = 65536  # bounds the per line arrays of one pass
+pixels_per_pass = 1 << 18  # bounds the per pixel arrays, about 112 bytes each
+tile_job = {}  # arrays of the running job in this process
+
+def bin_lines(lines, tiles_x, tiles_y, tile):
+    # lines of each tile their bounding box touches, sorted by tile, and
+    # where each tile's lines start
+    raw_low = np.minimum(lines[:, :2], lines[:, 2:]) // tile
+    raw_high = np.maximum(lines[:, :2], lines[:, 2:]) // tile
+    limit = np.array([tiles_x - 1, tiles_y - 1])
+    low = np.clip(raw_low, 0, limit)
+    high = np.clip(raw_high, 0, limit)
+    on_image = ((raw_high >= 0) & (raw_low <= limit)).all(axis=1)
+    span_x = high[:, 0] - low[:, 0] + 1
+    counts = np.where(on_image, span_x * (high[:, 1] - low[:, 1] + 1), 0)
+    starts = np.cumsum(counts) - counts
+    line = np.repeat(np.arange(len(lines)), counts)
+    i = np.arange(counts.sum()) - starts[line]
+    tile_id = (low[line, 1] + i // span_x[line]) * tiles_x + low[line, 0] + i % span_x[line]
+    order = np.argsort(tile_id, kind='stable')
+    tile_starts = np.searchsorted(tile_id[order], np.arange(tiles_x * tiles_y + 1))
+    return line[order], tile_starts
+
+def share_array(array):
+    memory = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared = np.ndarray(array.shape, array.dtype, buffer=memory.buf)
+    shared[...] = array
+    return memory, shared
+
+def init_tile_worker(specs, tile, tiles_x):
+    # maps the job's shared arrays into this worker, no copies are made
+    for key, (name, shape, dtype) in specs.items():
+        memory = shared_memory.SharedMemory(name=name)
+        tile_job[key + '_memory'] = memory  # the array is only valid while this lives
+        tile_job[key] = np.ndarray(shape, dtype, buffer=memory.buf)
+    tile_job['tile'] = tile
+    tile_job['tiles_x'] = tiles_x
+
+def rasterize_tiles(tile_ids):
+    lines, image = tile_job['lines'], tile_job['image']
+    tile_lines, tile_starts = tile_job['tile_lines'], tile_job['tile_starts']
+    tile, tiles_x = tile_job['tile'], tile_job['tiles_x']
+    image_height, image_width = image.shape
+    pixel_count = 0
+    for t in tile_ids:
+        x, y = t % tiles_x * tile, t // tiles_x * tile
+        window = (x, y, min(x + tile, image_width) - 1, min(y + tile, image_height) - 1)
+        chosen = tile_lines[tile_starts[t]:tile_starts[t + 1]]
+        for first in range(0, len(chosen), lines_per_pass):
+            prepared = prepare_lines(lines[chosen[first:first + lines_per_pass]], window)
+            # a clipped line can still be a tile long, so the lines are
+            # drawn in runs of about pixels_per_pass pixels
+            total = np.cumsum(np.maximum(prepared[6] - prepared[5] + 1, 0))
+            cuts = np.searchsorted(total, np.arange(pixels_per_pass, total[-1], pixels_per_pass))
+            bounds = [0, *np.unique(cuts).tolist(), len(total)]
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                pixels, _ = steps_pixels(*(v[start:end] for v in prepared))
+                image[pixels[:, 1], pixels[:, 0]] = 255
+                pixel_count += len(pixels)
+    return pixel_count
+
+def rasterize_offline(lines, image_width, image_height, workers=None, tile=tile_size):
+    # Returns a uint8 coverage image, 255 where draw_line() would put a
+    # pixel, with row 0 at the bottom.
+    lines = np.asarray(lines).astype(np.int64).reshape(-1, 4)
+    tiles_x = -(-image_width // tile)
+    tiles_y = -(-image_height // tile)
+    tile_lines, tile_starts = bin_lines(lines, tiles_x, tiles_y, tile)
+    busy = np.flatnonzero(np.diff(tile_starts))
+    job = {'lines': lines, 'tile_lines': tile_lines, 'tile_starts': tile_starts,
+           'image': np.zeros((image_height, image_width), dtype=np.uint8)}
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(busy) <= 1:
+        tile_job.update(job, tile=tile, tiles_x=tiles_x)
+        try:
+            rasterize_tiles(busy)
+            return job['image']
+        finally:
+            tile_job.clear()  # don't keep the arrays alive past the call
+
+    memories, specs = [], {}
+    try:
+        for key, array in job.items():
+            memory, job[key] = share_array(array)
+            memories.append(memory)
+            specs[key] = (memory.name, array.shape, array.dtype)
+        with ProcessPoolExecutor(workers, initializer=init_tile_worker,
+                                 initargs=(specs, tile, tiles_x)) as executor:
+            list(executor.map(rasterize_tiles, np.array_split(busy, workers * 4)))
+        return job['image'].copy()
+    finally:
+        for key in list(job):
+            job[key] = None  # drop views before the memory goes away
+        for memory in memories:
+            memory.close()
+            memory.unlink()
+
+
+# Streaming Line Input
+# Draws recorded line lists that may not fit in memory. Segments are read
+# chunk_rows at a time, from CSV text (x0,y0,x1,y1 per row) or from a
+# packed binary file of int32 x0, y0, x1, y1, and every chunk is drawn and
+# flushed before the next one is read, so memory use does not grow with
+# the file.
+chunk_rows = 65536
+
+def read_csv_chunks(path, chunk=chunk_rows):
+    with open(path) as f:
+        first = True
+        while True:
+            rows = list(islice(f, chunk))
+            if not rows:
+                return
+            if first and rows[0].lstrip()[:1] not in tuple('+-.0123456789'):
+                rows = rows[1:]  # header line
+            first = False
+            block = np.loadtxt(rows, delimiter=',', usecols=range(4), ndmin=2, comments='#')
+            if len(block):
+                yield block
+
+def read_binary_chunks(path, chunk=chunk_rows):
+    row_bytes = 4 * np.dtype(np.int32).itemsize
+    if not os.path.isfile(path):
+        # pipes and other streams have no size and can't be mapped, so
+        # they are read a chunk at a time until they run out
+        with open(path, 'rb') as f:
+            while True:
+                data = f.read(chunk * row_bytes)
+                rows = len(data) // row_bytes
+                if rows:
+                    yield np.frombuffer(data, np.int32, rows * 4).reshape(rows, 4)
+                if len(data) < chunk * row_bytes:
+                    return
+    rows = os.path.getsize(path) // row_bytes
+    for first in range(0, rows, chunk):
+        count = min(chunk, rows - first)
+        # maps just this chunk, it is unmapped when the next one is read
+        yield np.memmap(path, np.int32, 'r', offset=first * row_bytes, shape=(count, 4))
+
+def read_line_chunks(path, chunk=chunk_rows):
+    if str(path).lower().endswith(('.csv', '.txt')):
+        return read_csv_chunks(path, chunk)
+    return read_binary_chunks(path, chunk)
+
+def draw_line_chunk(block):
+    # draw_line() for every row of block, returns the number of pixels drawn.
+    # Long lines make many pixels each, so the rows are drawn and flushed
+    # in runs of about pixels_per_pass pixels.
+    on_grid = (block == np.round(block)).all(axis=1)
+    lines = np.asarray(block[on_grid]).astype(np.int64)
+    lengths = np.abs(lines[:, 2:] - lines[:, :2]).max(axis=1) + 1
+    total = np.cumsum(lengths)
+    cuts = np.searchsorted(total, np.arange(pixels_per_pass, total[-1] if len(total) else 0, pixels_per_pass))
+    pixels = 0
+    for part in np.split(lines, np.unique(cuts)):
+        if len(part):
+            pixels += draw_lines(part)
+            render_target.flush()
+    for x0, y0, x1, y1 in block[~on_grid].tolist():
+        # off the pixel grid draw_line() is not clipped or vectorized
+        draw_line(x0, y0, x1, y1)
+        pixels += int(max(abs(x1 - x0), abs(y1 - y0))) + 1
+    return pixels
+
+def stream_lines(path, chunk=chunk_rows):
+    # Draws every segment of path to the render target, returns counts
+    # and timings for stream_report().
+    stats = {'rows': 0, 'chunks': 0, 'pixels': 0, 'seconds': 0.0}
+    start = time.perf_counter()
+    for block in read_line_chunks(path, chunk):
+        stats['pixels'] += draw_line_chunk(block)
+        render_target.flush()
+        stats['rows'] += len(block)
+        stats['chunks'] += 1
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+def stream_report(stats):
+    seconds = max(stats['seconds'], 1e-9)
+    return (f"{stats['rows']} lines in {stats['chunks']} chunks, {stats['seconds']:.2f} s, "
+            f"{stats['rows'] / seconds:,.0f} lines/s, {stats['pixels'] / seconds:,.0f} pixels/s")
+
+
+# Rasterizer Benchmarks & Checks
+# python "22201005_md tasin hadi_02.py" --bench [results.json]
+# fuzzes every engine against draw_line() in all eight zones, and the
+# circle and ellipse engines against scalar midpoint versions, times them
+# per zone and per line length, and saves the numbers as JSON.
+bench_lengths = (1, 4, 16, 64, 256, 1024)
+bench_pixels = 200000  # pixels drawn by each vectorized timing
+reference_pixels = 20000  # draw_line() is much slower, so it draws fewer
+fuzz_cases = 2000
+
+class PixelRecorder:
+    # render target that keeps every pixel in draw order
+    def __init__(self):
+        self.pixels = []
+        self.color = (1, 1, 1)
+
+    def add(self, x, y):
+        self.pixels.append((x, y))
+
+    def add_pixels(self, pixels):
+        self.pixels.extend(map(tuple, np.asarray(pixels).tolist()))
+
+    def add_spans(self, spans):
+        self.add_pixels(span_pixels(spans))
+
+    def clear(self):
+        self.pixels = []
+
+    def flush(self):
+        pass
+
+def recorded(draw, *args):
+    # pixels draw(*args) sends to the render target
+    previous = render_target
+    recorder = PixelRecorder()
+    set_render_target(recorder)
+    try:
+        draw(*args)
+    finally:
+        set_render_target(previous)
+    return recorder.pixels
+
+def draw_line_each(lines):
+    for x0, y0, x1, y1 in lines:
+        draw_line(x0, y0, x1, y1)
+
+def zone_lines(rng, count, zone, length):
+    # count lines of the given zone 0 length that find_zone() puts in zone
+    dy = rng.integers(1, length, count) if length > 1 else np.zeros(count, dtype=np.int64)
+    delta = FROM_ZONE0[zone] @ np.stack([np.full(count, length), dy])
+    start = rng.integers(-1000, 1000, (count, 2))
+    return np.concatenate([start, start + delta.T], axis=1)
+
+def fuzz_lines(rng, count, spread):
+    # random lines plus the edge cases: points, axis aligned and diagonal
+    lines = rng.integers(-spread, spread, (count, 4))
+    edge = lines[:count // 4].copy()
+    kind = rng.integers(0, 4, len(edge))
+    edge[kind == 0, 2:] = edge[kind == 0, :2]
+    edge[kind == 1, 3] = edge[kind == 1, 1]
+    edge[kind == 2, 2] = edge[kind == 2, 0]
+    size = edge[kind == 3, 2] - edge[kind == 3, 0]
+    edge[kind == 3, 3] = edge[kind == 3, 1] + size * rng.choice((-1, 1), len(size))
+    lines[:len(edge)] = edge
+    return lines
+
+def check_round_trip(rng, failures):
+    points = np.concatenate([rng.integers(-10**6, 10**6, (fuzz_cases, 2)).astype(float),
+                             rng.uniform(-1000, 1000, (fuzz_cases, 2))])
+    for zone in range(8):
+        for x, y in points.tolist():
+            if convert_from_zone0(*convert_to_zone0(x, y, zone), zone) != (x, y):
+                failures.append({'check': 'zone round trip', 'zone': zone, 'point': [x, y]})
+        converted = np.array([convert_to_zone0(x, y, zone) for x, y in points.tolist()])
+        if not np.array_equal(converted, points @ TO_ZONE0[zone].T):
+            failures.append({'check': 'TO_ZONE0 matrix', 'zone': zone})
+    delta = rng.integers(-50, 51, (fuzz_cases, 2))
+    zones = find_zones(delta[:, 0], delta[:, 1])
+    for (dx, dy), zone in zip(delta.tolist(), zones.tolist()):
+        if find_zone(0, 0, dx, dy) != zone:
+            failures.append({'check': 'find_zones', 'delta': [dx, dy]})
+    return 8 * len(points) + fuzz_cases
 
+def check_line(line, pixels, failures):
+    # what every unclipped integer line must be, whatever drew it
+    x0, y0, x1, y1 = line
+    pixels = np.array(pixels).reshape(-1, 2)
+    if (len(pixels) != max(abs(x1 - x0), abs(y1 - y0)) + 1 or
+            tuple(pixels[0]) != (x0, y0) or tuple(pixels[-1]) != (x1, y1) or
+            (np.abs(np.diff(pixels, axis=0)).max(initial=1) != 1)):
+        failures.append({'check': 'line shape', 'line': line})
+
+def check_engines(rng, failures):
+    global clip_window, span_output
+    lines = fuzz_lines(rng, fuzz_cases, 300)
+    window = (-100, -80, 150, 120)
+    xmin, ymin, xmax, ymax = window
+    saved = clip_window, span_output
+    checked = 0
+    try:
+        clip_window = None
+        unclipped = [recorded(draw_line, *line) for line in lines.tolist()]
+        for clip_window in (None, window):
+            for line, full in zip(lines.tolist(), unclipped):
+                if clip_window is None:
+                    expected = full
+                    check_line(line, expected, failures)
+                else:
+                    # draw_line() clips with the same code as the engines,
+                    # so the clipped pixels are worked out from the full line
+                    expected = [(x, y) for x, y in full if xmin <= x <= xmax and ymin <= y <= ymax]
+                    if recorded(draw_line, *line) != expected:
+                        failures.append({'check': 'draw_line clipped', 'line': line, 'window': clip_window})
+                engines = {'midpoint_lines': midpoint_lines([line], clip_window)[0].tolist(),
+                           'midpoint_spans': span_pixels(midpoint_spans([line], clip_window)[0]).tolist()}
+                for name, pixels in engines.items():
+                    if list(map(tuple, pixels)) != expected:
+                        failures.append({'check': name, 'line': line, 'window': clip_window})
+                checked += 1
+        # whole batches, so lines are also laid out back to back correctly
+        clip_window = None
+        expected = recorded(draw_line_each, lines.tolist())
+        for span_output in (False, True):
+            if recorded(draw_lines, lines) != expected:
+                failures.append({'check': 'draw_lines batch', 'spans': span_output})
+        # offline tiles cover the same pixels as the lines on the image
+        pixels = np.array(expected)
+        image = np.zeros((600, 600), dtype=np.uint8)
+        pixels = pixels[((pixels >= 0) & (pixels < 600)).all(axis=1)]
+        image[pixels[:, 1], pixels[:, 0]] = 255
+        if not np.array_equal(rasterize_offline(lines, 600, 600, workers=1, tile=128), image):
+            failures.append({'check': 'rasterize_offline'})
+    finally:
+        clip_window, span_output = saved
+    return checked + 3
+
+def circle_points(xc, yc, r):
+    # the textbook midpoint circle, one octant mirrored eight ways
+    points = set()
+    x, y, d = 0, r, 1 - r
+    while x <= y:
+        for px, py in ((x, y), (y, x), (-x, y), (-y, x), (x, -y), (y, -x), (-x, -y), (-y, -x)):
+            points.add((xc + px, yc + py))
+        if d < 0:
+            d += 2 * x + 3
+        else:
+            d += 2 * (x - y) + 5
+            y -= 1
+        x += 1
+    return points
+
+def ellipse_points(xc, yc, rx, ry):
+    # the textbook midpoint ellipse, regions 1 and 2 of one quadrant
+    # mirrored four ways
+    points = set()
+    rx2, ry2 = rx * rx, ry * ry
+    x, y = 0, ry
+    slope_x, slope_y = 0, 2 * rx2 * y
+    d = ry2 - rx2 * ry + rx2 / 4
+    while slope_x < slope_y:
+        points.update(((xc + x, yc + y), (xc - x, yc + y), (xc + x, yc - y), (xc - x, yc - y)))
+        x += 1
+        slope_x += 2 * ry2
+        if d < 0:
+            d += slope_x + ry2
+        else:
+            y -= 1
+            slope_y -= 2 * rx2
+            d += slope_x - slope_y + ry2
+    d = ry2 * (x + 0.5) ** 2 + rx2 * (y - 1) ** 2 - rx2 * ry2
+    while y >= 0:
+        points.update(((xc + x, yc + y), (xc - x, yc + y), (xc + x, yc - y), (xc - x, yc - y)))
+        y -= 1
+        slope_y -= 2 * rx2
+        if d > 0:
+            d += rx2 - slope_y
+        else:
+            x += 1
+            slope_x += 2 * ry2
+            d += slope_x - slope_y + rx2
+    return points
+
+def check_curves(rng, failures):
+    # the batched engines draw the same pixels as the scalar ones
+    count = fuzz_cases // 4
+    centers = rng.integers(-500, 500, (count, 2))
+    radii = np.concatenate([rng.integers(0, 8, (count // 2, 2)), rng.integers(0, 200, (count - count // 2, 2))])
+    for name, engine, reference, shapes in (
+            ('midpoint_circles', midpoint_circles, circle_points, radii[:, 0]),
+            ('midpoint_ellipses', midpoint_ellipses, ellipse_points, radii)):
+        pixels, counts = engine(centers, shapes)
+        for center, shape, drawn in zip(centers.tolist(), shapes.tolist(), np.split(pixels, np.cumsum(counts)[:-1])):
+            if set(map(tuple, drawn.tolist())) != reference(*center, *np.atleast_1d(shape).tolist()):
+                failures.append({'check': name, 'center': center, 'radius': shape})
+    return 2 * count
+
+def check_floats(rng, failures):
+    # diamond_y is a float after update(), so draw_line() also gets floats
+    global clip_window
+    saved = clip_window
+    clip_window = None
+    try:
+        lines = fuzz_lines(rng, fuzz_cases // 4, 300)
+        for line in lines.tolist():
+            if recorded(draw_line, *map(float, line)) != recorded(draw_line, *line):
+                failures.append({'check': 'integral floats', 'line': line})
+        for line in (lines + rng.uniform(0, 1, lines.shape)).tolist():
+            pixels = np.array(recorded(draw_line, *line))
+            dx, dy = abs(line[2] - line[0]), abs(line[3] - line[1])
+            if len(pixels) != int(max(dx, dy)) + 1 or np.abs(pixels[0] - line[:2]).max() > 1e-9:
+                failures.append({'check': 'float line', 'line': line})
+        # lines along an edge, up to a pixel and a half either side of it.
+        # Any that covers a pixel on the screen must keep all of its pixels.
+        edge = rng.uniform(-20, 20, (len(lines), 4)) + (0, 0, width, height) * rng.integers(0, 2, (len(lines), 4))
+        along = rng.integers(0, 2, len(edge))  # 0 runs along x at a fixed y, 1 the other way
+        fixed = rng.choice((0, height), len(edge)) * (1 - along) + rng.choice((0, width), len(edge)) * along
+        fixed = fixed + rng.uniform(-1.5, 1.5, len(edge))
+        edge[along == 0, 1] = edge[along == 0, 3] = fixed[along == 0]
+        edge[along == 1, 0] = edge[along == 1, 2] = fixed[along == 1]
+        edge = edge.tolist()
+        whole = [recorded(draw_line, *line) for line in edge]
+        clip_window = (0, 0, width, height)
+        for line, pixels in zip(edge, whole):
+            corner = np.floor(np.array(pixels) - 0.5)  # the lower left pixel each point covers
+            if ((corner >= -1) & (corner <= (width - 1, height - 1))).all(axis=1).any():
+                if recorded(draw_line, *line) != pixels:
+                    failures.append({'check': 'clipped float line', 'line': line})
+    finally:
+        clip_window = saved
+    return 3 * len(lines)
+
+def best_time(run, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def time_engines(lines):
+    # pixels per second of every engine on lines, clipping off
+    pixels = int(np.abs(lines[:, 2:] - lines[:, :2]).max(axis=1).sum()) + len(lines)
+    reference = lines[:max(1, len(lines) * reference_pixels // max(pixels, 1))]
+    reference_count = int(np.abs(reference[:, 2:] - reference[:, :2]).max(axis=1).sum()) + len(reference)
+    reference = reference.tolist()
+    counter = PixelRecorder()
+    counter.add = lambda x, y: None  # time the rasterizer, not the list
+    previous = render_target
+    set_render_target(counter)
+    try:
+        draw_time = best_time(lambda: draw_line_each(reference))
+    finally:
+        set_render_target(previous)
+    return {
+        'lines': len(lines),
+        'pixels': pixels,
+        'draw_line': reference_count / draw_time,
+        'midpoint_lines': pixels / best_time(lambda: midpoint_lines(lines)),
+        'midpoint_spans': pixels / best_time(lambda: midpoint_spans(lines)),
+    }
+
+def run_bench(path='rasterizer_bench.json', seed=0):
+    global clip_window
+    rng = np.random.default_rng(seed)
+    failures = []
+    started = time.perf_counter()
+    checks = (check_round_trip(rng, failures) + check_engines(rng, failures) +
+              check_curves(rng, failures) + check_floats(rng, failures))
+    results = {'seed': seed, 'numpy': np.__version__, 'checks': checks,
+               'failures': failures[:100], 'failure_count': len(failures),
+               'zones': {}, 'lengths': {}}
+    saved = clip_window
+    clip_window = None
+    try:
+        for zone in range(8):
+            results['zones'][zone] = time_engines(zone_lines(rng, bench_pixels // 65, zone, 64))
+        for length in bench_lengths:
+            zones = rng.integers(0, 8, max(bench_pixels // (length + 1), 1))
+            lines = np.concatenate([zone_lines(rng, 1, zone, length) for zone in zones])
+            results['lengths'][length] = time_engines(lines)
+        deltas = rng.integers(-100, 101, (fuzz_cases * 10, 2))
+        results['find_zone'] = len(deltas) / best_time(lambda: [find_zone(0, 0, dx, dy) for dx, dy in deltas.tolist()])
+        results['find_zones'] = len(deltas) / best_time(lambda: find_zones(deltas[:, 0], deltas[:, 1]))
+    finally:
+        clip_window = saved
+    results['seconds'] = time.perf_counter() - started
+
+    print(f"{checks} checks, {len(failures)} failures")
+    for failure in failures[:10]:
+        print("  ", failure)
+    print("pixels/s       draw_line  midpoint_lines  midpoint_spans")
+    for label, table in (('zone', results['zones']), ('length', results['lengths'])):
+        for key, row in table.items():
+            print(f"{label} {key:<8}{row['draw_line']:>11,.0f}{row['midpoint_lines']:>16,.0f}{row['midpoint_spans']:>16,.0f}")
+    print(f"find_zone {results['find_zone']:,.0f}/s, find_zones {results['find_zones']:,.0f}/s")
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"saved {path}")
+    return 1 if failures else 0
 
-# AABB Collision
 class AABB:
     def __init__(self, x, y, width, height):
         self.x, self.y, self.width, self.height = x, y, width, height
@@ -114,45 +1050,104 @@ def has_collided(box1, box2):
             box1.y + box1.height > box2.y)
 
 
-# Drawing Functions 
-def draw_diamond(x, y, size):
-    glColor3f(*game.diamond_color)
-    draw_line(x, y + size, x + size, y)
-    draw_line(x + size, y, x, y - size)
-    draw_line(x, y - size, x - size, y)
-    draw_line(x - size, y, x, y + size)
-
-def draw_catcher(x, y, width, height):
-    glColor3f(1, 0, 0) if game.game_over else glColor3f(1, 1, 1)
+# Shape Cache
+# Shapes are rasterized once at the origin; integer translation does not
+# change which pixels midpoint() picks, so drawing only adds an offset.
+def diamond_shape(size, variant):
+    return [(0, size, size, 0),
+            (size, 0, 0, -size),
+            (0, -size, -size, 0),
+            (-size, 0, 0, size)]
+
+def catcher_shape(size, variant):
+    width, height = size
     half = width // 2
-    draw_line(x - half + 15, y, x - half, y + height)
-    draw_line(x - half, y + height, x + half, y + height)
-    draw_line(x + half, y + height, x + half - 15, y)
-    draw_line(x - half + 15, y, x + half - 15, y)
+    return [(-half + 15, 0, -half, height),
+            (-half, height, half, height),
+            (half, height, half - 15, 0),
+            (-half + 15, 0, half - 15, 0)]
 
-def restart(x, y, size):
-    glColor3f(0, 0.8, 0.8)
+def restart_shape(size, variant):
     half = size // 2
-    draw_line(x - half, y, x, y + half)
-    draw_line(x - half, y, x, y - half)
-    draw_line(x - half, y, x + half, y)
+    return [(-half, 0, 0, half),
+            (-half, 0, 0, -half),
+            (-half, 0, half, 0)]
 
-def play_pause(x, y, size):
-    glColor3f(1, 0.6, 0)
+def play_pause_shape(size, paused):
     half = size // 2
-    if game.paused:
-        draw_line(x - half, y - half, x - half, y + half)
-        draw_line(x - half, y + half, x + half, y)
-        draw_line(x + half, y, x - half, y - half)
+    if paused:
+        return [(-half, -half, -half, half),
+                (-half, half, half, 0),
+                (half, 0, -half, -half)]
+    return [(-8, -half, -8, half),
+            (8, -half, 8, half)]
+
+def cross_shape(size, variant):
+    half = size // 2
+    return [(-half, -half, half, half),
+            (-half, half, half, -half)]
+
+SHAPES = {
+    'diamond': diamond_shape,
+    'catcher': catcher_shape,
+    'restart': restart_shape,
+    'play_pause': play_pause_shape,
+    'cross': cross_shape,
+}
+
+class ShapeCache:
+    def __init__(self, max_entries=64):
+        self.entries = OrderedDict()  # least recently used first
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, shape, size, variant=None, spans=False):
+        # pixel offsets, or span offsets when spans is set
+        key = (shape, size, variant, spans)
+        pixels = self.entries.get(key)
+        if pixels is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return pixels
+        self.misses += 1
+        rasterize = midpoint_spans if spans else midpoint_lines
+        pixels, _ = rasterize(SHAPES[shape](size, variant))
+        pixels = pixels.astype(np.int32)
+        self.entries[key] = pixels
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return pixels
+
+shape_cache = ShapeCache()
+
+def draw_shape(shape, x, y, size, variant=None):
+    if span_output:
+        render_target.add_spans(shape_cache.get(shape, size, variant, True) + (x, y, x, y))
     else:
-        draw_line(x - 8, y - half, x - 8, y + half)
-        draw_line(x + 8, y - half, x + 8, y + half)
+        render_target.add_pixels(shape_cache.get(shape, size, variant) + (x, y))
+
+
+# Drawing Functions 
+def draw_diamond(x, y, size, color):
+    set_color(*color)
+    draw_shape('diamond', x, y, size)
+
+def draw_catcher(x, y, width, height, game_over):
+    set_color(1, 0, 0) if game_over else set_color(1, 1, 1)
+    draw_shape('catcher', x, y, (width, height))
+
+def restart(x, y, size):
+    set_color(0, 0.8, 0.8)
+    draw_shape('restart', x, y, size)
+
+def play_pause(x, y, size, paused):
+    set_color(1, 0.6, 0)
+    draw_shape('play_pause', x, y, size, paused)
 
 def cross(x, y, size):
-    glColor3f(1, 0, 0)
-    half = size // 2
-    draw_line(x - half, y - half, x + half, y + half)
-    draw_line(x - half, y + half, x + half, y - half)
+    set_color(1, 0, 0)
+    draw_shape('cross', x, y, size)
 
 
 # Game logic
@@ -166,10 +1161,10 @@ class Game:
         self.diamond_y = height - 100
         self.diamond_speed = 100
         self.diamond_color = self.random_color()
+        self.storm = None  # DiamondStorm while storm mode is on
         
     def random_color(self):
-        colors = [(1, 0, 0), (0, 1, 0), (0, 0, 1), (1, 1, 0), (1, 0, 1), (0, 1, 1)]
-        return random.choice(colors)
+        return random.choice(diamond_colors)
     
     def restart_game(self):
         self.score = 0
@@ -180,7 +1175,12 @@ class Game:
         self.diamond_y = height - 100
         self.diamond_speed = 100
         self.diamond_color = self.random_color()
+        if self.storm is not None:
+            self.storm = DiamondStorm(storm_count)
         print("Starting Over")
+
+    def toggle_storm(self):
+        self.storm = DiamondStorm(storm_count) if self.storm is None else None
     
     def spawn_new_diamond(self):
         self.diamond_x = random.randint(50, width - 50)
@@ -189,15 +1189,224 @@ class Game:
         self.diamond_color = self.random_color()
 
 game = Game()
-last_time = time.time()
 
 
 # Collision Check 
-def check_collision():
-    diamond_box = AABB(game.diamond_x - diamond_size, game.diamond_y - diamond_size, diamond_size * 2, diamond_size * 2)
-    catcher_box = AABB(game.catcher_x - catcher_h//2, 40, catcher_h, catcher_w)
+def check_collision(g):
+    if exact_collision:
+        return shapes_touch(g.diamond_x, g.diamond_y, g.catcher_x)
+    diamond_box = AABB(g.diamond_x - diamond_size, g.diamond_y - diamond_size, diamond_size * 2, diamond_size * 2)
+    catcher_box = AABB(g.catcher_x - catcher_h//2, 40, catcher_h, catcher_w)
     return has_collided(diamond_box, catcher_box)
 
+def catches(diamond_x, diamond_y, catcher_x):
+    # check_collision() over arrays of diamonds and catchers
+    left = catcher_x - catcher_h // 2
+    return ((diamond_x - diamond_size < left + catcher_h) &
+            (diamond_x + diamond_size > left) &
+            (diamond_y - diamond_size < 40 + catcher_w) &
+            (diamond_y + diamond_size > 40))
+
+
+# Bitmask Collision
+# The boxes above are a loose fit for the diamond and the trapezoid
+# catcher. With exact_collision set, shapes only touch where their filled
+# rasterizations share a pixel. Every mask row is a Python int, bit i
+# being pixel x + i, so one row pair is tested with a shift and an AND.
+exact_collision = False
+
+class ShapeMask:
+    def __init__(self, pixels):
+        # fills every row of a convex outline between its end pixels
+        low = pixels.min(axis=0)
+        high = pixels.max(axis=0)
+        self.x, self.y = int(low[0]), int(low[1])  # pixel of bit 0 in row 0
+        self.width = int(high[0] - low[0]) + 1
+        self.height = int(high[1] - low[1]) + 1
+        row = pixels[:, 1] - self.y
+        start = np.full(self.height, self.width, dtype=np.int64)
+        end = np.full(self.height, -1, dtype=np.int64)
+        np.minimum.at(start, row, pixels[:, 0] - self.x)
+        np.maximum.at(end, row, pixels[:, 0] - self.x)
+        self.rows = [((1 << (e - s + 1)) - 1) << s if e >= s else 0
+                     for s, e in zip(start.tolist(), end.tolist())]
+
+mask_cache = {}
+
+def shape_mask(shape, size, variant=None):
+    key = (shape, size, variant)
+    mask = mask_cache.get(key)
+    if mask is None:
+        mask = mask_cache[key] = ShapeMask(shape_cache.get(shape, size, variant))
+    return mask
+
+def masks_overlap(mask1, x1, y1, mask2, x2, y2):
+    # True if mask1 drawn at (x1, y1) and mask2 at (x2, y2) share a pixel
+    left1, bottom1 = x1 + mask1.x, y1 + mask1.y
+    left2, bottom2 = x2 + mask2.x, y2 + mask2.y
+    if not has_collided(AABB(left1, bottom1, mask1.width, mask1.height),
+                        AABB(left2, bottom2, mask2.width, mask2.height)):
+        return False
+    # row r of mask1 is row r + dy of mask2, bit b of it is bit b + shift
+    dy = bottom1 - bottom2
+    shift = left1 - left2
+    first, last = max(0, -dy), min(mask1.height, mask2.height - dy)
+    rows1 = mask1.rows[first:last]
+    rows2 = mask2.rows[first + dy:last + dy]
+    if shift < 0:
+        rows1, rows2, shift = rows2, rows1, -shift
+    for row1, row2 in zip(rows1, rows2):
+        if (row1 << shift) & row2:
+            return True
+    return False
+
+def pixel_row(y):
+    # the whole y that draws the same pixels as draw_line() does at a
+    # float y: a size 2 point covers rows floor(y - 0.5) and one above
+    return np.floor(np.asarray(y) + 0.5)
+
+def shapes_touch(diamond_x, diamond_y, catcher_x):
+    # exact check_collision() for one diamond, on the rows render() draws
+    return masks_overlap(shape_mask('diamond', diamond_size), diamond_x, int(pixel_row(diamond_y)),
+                         shape_mask('catcher', (catcher_h, catcher_w)), catcher_x, 40)
+
+
+# Diamond Storm
+storm_count = 10000
+bucket_width = 32  # pixels per column of the storm collision index
+
+class DiamondStorm:
+    # struct of arrays, one slot per falling diamond. The slots are kept
+    # sorted by column, x // bucket_width, so the diamonds near the
+    # catcher are one slice; respawned ones may be out of place and are
+    # listed in moved until the next sort, which reorders the slots.
+    def __init__(self, count, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.x = np.zeros(count, dtype=np.int64)
+        self.y = np.zeros(count, dtype=np.float64)
+        self.speed = np.zeros(count, dtype=np.float64)
+        self.color = np.zeros(count, dtype=np.int64)
+        # column b is the slots bucket_starts[b]:bucket_starts[b + 1]
+        self.bucket_starts = None
+        self.moved = np.zeros(0, dtype=np.int64)
+        self.respawn(np.arange(count), spread=2 * height)
+
+    def respawn(self, idx, spread=height):
+        n = len(idx)
+        if n == 0:
+            return
+        self.x[idx] = self.rng.integers(50, width - 50, n, endpoint=True)
+        self.y[idx] = height + diamond_size + self.rng.uniform(0, spread, n)
+        self.speed[idx] = self.rng.uniform(80, 200, n)
+        self.color[idx] = self.rng.integers(0, len(diamond_colors), n)
+        self.moved = np.concatenate([self.moved, idx])
+
+    def build_index(self):
+        # counting sort of the slots by column, a radix sort for int16
+        buckets = self.x // bucket_width
+        order = np.argsort(buckets.astype(np.int16), kind='stable')
+        for name in ('x', 'y', 'speed', 'color'):
+            setattr(self, name, getattr(self, name)[order])
+        self.bucket_starts = np.zeros(width // bucket_width + 2, dtype=np.int64)
+        np.cumsum(np.bincount(buckets, minlength=len(self.bucket_starts) - 1), out=self.bucket_starts[1:])
+        self.moved = np.zeros(0, dtype=np.int64)
+
+    def catcher_hits(self, catcher_x):
+        # sorting again once a slot in eight has moved keeps the moved
+        # list short at about one sort in fifty steps
+        if self.bucket_starts is None or len(self.moved) > len(self.x) // 8:
+            self.build_index()
+        left = catcher_x - catcher_h // 2
+        # only diamonds whose column overlaps the catcher can touch it,
+        # unless they have moved since the sort
+        b0 = max((left - diamond_size) // bucket_width, 0)
+        b1 = min((left + catcher_h + diamond_size) // bucket_width, len(self.bucket_starts) - 2)
+        start, end = self.bucket_starts[b0], self.bucket_starts[b1 + 1]
+        hits = start + np.flatnonzero(catches(self.x[start:end], self.y[start:end], catcher_x))
+        moved = self.moved[catches(self.x.take(self.moved), self.y.take(self.moved), catcher_x)]
+        if len(moved):
+            hits = np.union1d(hits, moved)  # a slot can be in both, or moved twice
+        if exact_collision and len(hits):
+            exact = [shapes_touch(x, y, catcher_x) for x, y in zip(self.x[hits].tolist(), self.y[hits].tolist())]
+            hits = hits[np.array(exact, dtype=bool)]
+        return hits
+
+    def update(self, dt, catcher_x):
+        # moves every diamond, returns how many were caught
+        self.y -= self.speed * dt
+        caught = self.catcher_hits(catcher_x)
+        self.respawn(caught)
+        # missed diamonds go back to the top instead of ending the game
+        self.respawn(np.flatnonzero(self.y < 20))
+        return len(caught)
+
+# Batch Environment
+class CatchEnv:
+    # n independent headless games stepped together with a fixed dt,
+    # for training catcher policies
+    STAY, LEFT, RIGHT = 0, 1, 2
+
+    def __init__(self, n, dt=1 / 60, seed=None):
+        self.n = n
+        self.dt = dt
+        self.rng = np.random.default_rng(seed)
+        self.catcher_x = np.zeros(n, dtype=np.int64)
+        self.diamond_x = np.zeros(n, dtype=np.int64)
+        self.diamond_y = np.zeros(n, dtype=np.float64)
+        self.diamond_speed = np.zeros(n, dtype=np.float64)
+        self.score = np.zeros(n, dtype=np.int64)
+
+    def reset(self, idx=None):
+        self.restart(np.arange(self.n) if idx is None else idx)
+        return self.observe()
+
+    def restart(self, idx):
+        # reset() without building the observations
+        self.catcher_x[idx] = width // 2
+        self.diamond_speed[idx] = 100
+        self.score[idx] = 0
+        self.spawn(idx)
+
+    def spawn(self, idx):
+        self.diamond_x[idx] = self.rng.integers(50, width - 50, len(idx), endpoint=True)
+        self.diamond_y[idx] = height - 100
+
+    def observe(self):
+        # one row per game: catcher x, diamond x, diamond y, diamond speed
+        return np.stack([self.catcher_x, self.diamond_x,
+                         self.diamond_y, self.diamond_speed], axis=1).astype(np.float32)
+
+    def step(self, actions):
+        # returns observations, rewards and dones; finished games restart
+        actions = np.asarray(actions)
+        move = np.where(actions == self.LEFT, -30, np.where(actions == self.RIGHT, 30, 0))
+        np.clip(self.catcher_x + move, catcher_h // 2, width - catcher_h // 2, out=self.catcher_x)
+        self.diamond_y -= self.diamond_speed * self.dt
+        caught = catches(self.diamond_x, self.diamond_y, self.catcher_x)
+        done = ~caught & (self.diamond_y < 20)
+        hit = np.flatnonzero(caught)
+        self.score[hit] += 1
+        self.diamond_speed[hit] += 20  # same ramp as spawn_new_diamond()
+        self.spawn(hit)
+        self.restart(np.flatnonzero(done))
+        return self.observe(), caught.astype(np.float32), done
+
+
+def draw_storm(storm):
+    offsets = shape_cache.get('diamond', diamond_size, spans=span_output).astype(np.float32)
+    visible = storm.y < height + diamond_size
+    for c, color in enumerate(diamond_colors):
+        picked = visible & (storm.color == c)
+        if picked.any():
+            set_color(*color)
+            # same pixel row as draw_diamond gets from render()
+            pos = np.stack([storm.x[picked], pixel_row(storm.y[picked])], axis=1).astype(np.float32)
+            if span_output:
+                pos = np.tile(pos, 2)
+                render_target.add_spans((pos[:, None, :] + offsets).reshape(-1, 4))
+            else:
+                render_target.add_pixels((pos[:, None, :] + offsets).reshape(-1, 2))
+
 
 # Button Click 
 def click_button(mouse_x, mouse_y, button_x, button_y, size):
@@ -207,42 +1416,265 @@ def click_button(mouse_x, mouse_y, button_x, button_y, size):
 
 
 # Display 
-def display():
-    glClear(GL_COLOR_BUFFER_BIT)
+def draw_buttons(g):
     restart(80, height - 60, 40)
-    play_pause(width // 2, height - 60, 40)
+    play_pause(width // 2, height - 60, 40, g.paused)
     cross(width - 80, height - 60, 40)
-    if not game.game_over:
-        draw_diamond(game.diamond_x, game.diamond_y, diamond_size)
-    draw_catcher(game.catcher_x, 40, catcher_h, catcher_w)
+
+def shape_rect(shape, x, y, size, variant=None):
+    # screen pixels the shape's size 2 points can touch, x0, y0, x1, y1 with ends excluded
+    mask = shape_mask(shape, size, variant)
+    return (x + mask.x - 1, y + mask.y - 1, x + mask.x + mask.width, y + mask.y + mask.height)
+
+def moving_shapes(g):
+    # what render() draws after the buttons and the storm, in order, as
+    # (draw function, arguments, bounding rect)
+    shapes = []
+    if g.storm is None and not g.game_over:
+        # diamond_y is a float after update(); rasterize on the pixel row
+        diamond = (g.diamond_x, int(pixel_row(g.diamond_y)), diamond_size, g.diamond_color)
+        shapes.append((draw_diamond, diamond, shape_rect('diamond', *diamond[:3])))
+    catcher = (g.catcher_x, 40, catcher_h, catcher_w, g.game_over)
+    shapes.append((draw_catcher, catcher, shape_rect('catcher', g.catcher_x, 40, (catcher_h, catcher_w))))
+    return shapes
+
+def render(g):
+    # draws one frame of g into render_target, nothing else is read
+    render_target.clear()
+    draw_buttons(g)
+    if g.storm is not None:
+        draw_storm(g.storm)
+    for draw, args, _ in moving_shapes(g):
+        draw(*args)
+    render_target.flush()
+
+# Dirty Rectangle Screen
+# The on-screen path keeps the frame in a CPU RGBA Framebuffer shown with
+# one textured quad. The buttons are drawn into the framebuffer's
+# background once. Each frame only the rectangles of shapes that moved or
+# changed are restored from it, redrawn and uploaded with glTexSubImage2D,
+# so the work follows the motion and not the size of the window.
+texture_output = True  # False draws GL points every frame with render()
+# Storm frames change everywhere, so they always go through render(); a
+# full CPU redraw and upload of them would not fit in a 60 Hz frame.
+
+def intersect(rect1, rect2):
+    return (max(rect1[0], rect2[0]), max(rect1[1], rect2[1]),
+            min(rect1[2], rect2[2]), min(rect1[3], rect2[3]))
+
+class DirtyScreen:
+    def __init__(self, width, height, max_rects=16):
+        self.frame = Framebuffer(width, height, channels=4)
+        self.blank = self.frame.background.copy()
+        self.screen_rect = (0, 0, width, height)
+        self.max_rects = max_rects  # more dirty rects than this redraws everything
+        self.texture = None
+        self.layout = None  # (paused, storm on) of the frame in the texture
+        self.shapes = []  # moving_shapes() of that frame
+        self.frames = 0
+        self.uploaded = 0  # bytes sent to the texture
+
+    def update(self, g):
+        # draws g into frame, returns the rectangles that changed
+        previous = render_target
+        set_render_target(self.frame)
+        try:
+            shapes = moving_shapes(g)
+            layout = (g.paused, g.storm is not None)
+            # old and new rect of every shape that moved or changed
+            rects = [shape[2] for shape in self.shapes if shape not in shapes]
+            rects += [shape[2] for shape in shapes if shape not in self.shapes]
+            if layout != self.layout or g.storm is not None or len(rects) > self.max_rects:
+                if self.layout is None or layout[0] != self.layout[0]:  # buttons changed
+                    np.copyto(self.frame.background, self.blank)
+                    self.frame.clear()
+                    draw_buttons(g)
+                    np.copyto(self.frame.background, self.frame.pixels)
+                self.frame.clear()
+                if g.storm is not None:
+                    draw_storm(g.storm)
+                for draw, args, _ in shapes:
+                    draw(*args)
+                rects = [self.screen_rect]
+            else:
+                rects = [intersect(rect, self.screen_rect) for rect in rects]
+                rects = [r for r in rects if r[0] < r[2] and r[1] < r[3]]
+                for x0, y0, x1, y1 in rects:
+                    self.frame.pixels[y0:y1, x0:x1] = self.frame.background[y0:y1, x0:x1]
+                    self.frame.clip = (x0, y0, x1, y1)
+                    for draw, args, rect in shapes:
+                        box = intersect(rect, self.frame.clip)
+                        if box[0] < box[2] and box[1] < box[3]:
+                            draw(*args)
+                self.frame.clip = self.screen_rect
+        finally:
+            set_render_target(previous)
+        self.layout = layout
+        self.shapes = shapes
+        return rects
+
+    def upload(self, rects):
+        pixels = self.frame.pixels
+        if self.texture is None:
+            self.texture = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_2D, self.texture)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA8, self.frame.width, self.frame.height,
+                         0, GL_RGBA, GL_UNSIGNED_BYTE, pixels)
+            self.uploaded += pixels.nbytes
+            return
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        # each rect is read straight out of the whole frame
+        glPixelStorei(GL_UNPACK_ROW_LENGTH, self.frame.width)
+        for x0, y0, x1, y1 in rects:
+            glPixelStorei(GL_UNPACK_SKIP_PIXELS, x0)
+            glPixelStorei(GL_UNPACK_SKIP_ROWS, y0)
+            glTexSubImage2D(GL_TEXTURE_2D, 0, x0, y0, x1 - x0, y1 - y0,
+                            GL_RGBA, GL_UNSIGNED_BYTE, pixels)
+            self.uploaded += (x1 - x0) * (y1 - y0) * 4
+        glPixelStorei(GL_UNPACK_ROW_LENGTH, 0)
+        glPixelStorei(GL_UNPACK_SKIP_PIXELS, 0)
+        glPixelStorei(GL_UNPACK_SKIP_ROWS, 0)
+
+    def draw(self):
+        glEnable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_REPLACE)
+        glBegin(GL_QUADS)
+        glTexCoord2f(0, 0)
+        glVertex2f(0, 0)
+        glTexCoord2f(1, 0)
+        glVertex2f(self.frame.width, 0)
+        glTexCoord2f(1, 1)
+        glVertex2f(self.frame.width, self.frame.height)
+        glTexCoord2f(0, 1)
+        glVertex2f(0, self.frame.height)
+        glEnd()
+        glDisable(GL_TEXTURE_2D)
+
+    def render(self, g):
+        self.upload(self.update(g))
+        self.draw()
+        self.frames += 1
+
+    def summary(self):
+        if not self.frames:
+            return "no frames drawn"
+        return f"{self.uploaded / self.frames / 1024:.1f} KB uploaded per frame"
+
+screen = DirtyScreen(width, height)
+
+def display():
+    # the texture still holds the last frame it drew, which is what the
+    # dirty rectangles compare against once a storm ends
+    if texture_output and game.storm is None:
+        screen.render(game)
+    else:
+        render(game)
     glutSwapBuffers()
+    pacer.frame()
 
 
 # Update 
-def update():
-    global last_time
-    if not game.paused and not game.game_over:
-        current_time = time.time()
-        dt = current_time - last_time
-        last_time = current_time
-        game.diamond_y -= game.diamond_speed * dt
-        if check_collision():
-            game.score += 1
-            print(f"Score: {game.score}")
-            game.spawn_new_diamond()
-        elif game.diamond_y < 20:
-            game.game_over = True
-            print(f"Game Over! Final Score: {game.score}")
-    glutPostRedisplay()
+target_fps = 60
+sim_dt = 1 / 120  # fixed physics step in seconds
+max_frame_time = 0.25  # most time one tick will catch up on
+
+def update(g, dt):
+    # advances g by dt seconds, returns True if the frame changed
+    if g.paused or g.game_over:
+        return False
+    if g.storm is not None:
+        caught = g.storm.update(dt, g.catcher_x)
+        if caught:
+            g.score += caught
+            print(f"Score: {g.score}")
+        return True
+    g.diamond_y -= g.diamond_speed * dt
+    if check_collision(g):
+        g.score += 1
+        print(f"Score: {g.score}")
+        g.spawn_new_diamond()
+    elif g.diamond_y < 20:
+        g.game_over = True
+        print(f"Game Over! Final Score: {g.score}")
+    return True
+
+
+# Frame Loop
+class FramePacer:
+    def __init__(self, window=240):
+        self.intervals = deque(maxlen=window)
+        self.last_frame = None
+
+    def frame(self):
+        now = time.perf_counter()
+        if self.last_frame is not None:
+            self.intervals.append(now - self.last_frame)
+        self.last_frame = now
+
+    def skip(self):
+        # no frame this tick, so the next interval would not be pacing
+        self.last_frame = None
+
+    def summary(self):
+        if not self.intervals:
+            return "no frames measured"
+        ms = np.array(self.intervals) * 1000
+        return (f"{1000 / ms.mean():.1f} fps, frame time {ms.mean():.2f} ms "
+                f"+/- {ms.std():.2f} ms, worst {ms.max():.2f} ms")
+
+pacer = FramePacer()
+accumulator = 0.0
+last_time = time.perf_counter()
+next_tick = last_time
+needs_redraw = True
+
+def request_redraw():
+    global needs_redraw
+    needs_redraw = True
+
+def tick(value):
+    global accumulator, last_time, next_tick, needs_redraw
+    now = time.perf_counter()
+    if game.paused or game.game_over:
+        accumulator = 0.0  # paused time is not replayed on resume
+    else:
+        accumulator += min(now - last_time, max_frame_time)
+    last_time = now
+    while accumulator >= sim_dt:
+        if update(game, sim_dt):
+            needs_redraw = True
+        accumulator -= sim_dt
+    if needs_redraw:
+        needs_redraw = False
+        glutPostRedisplay()
+    else:
+        pacer.skip()
+    next_tick += 1 / target_fps
+    if next_tick < now:  # fell behind, start pacing again from now
+        next_tick = now
+    glutTimerFunc(int((next_tick - now) * 1000), tick, 0)
 
 
 # keyboard & mouse Controls 
+def keyboard(key, x, y):
+    global exact_collision
+    if key == b's':  # storm mode on/off
+        game.toggle_storm()
+        request_redraw()
+    elif key == b'e':  # exact bitmask collision on/off
+        exact_collision = not exact_collision
+
+
 def keyboard_special(key, x, y):
     if not game.game_over and not game.paused:  # catcher won't move if paused
         if key == GLUT_KEY_LEFT:
             game.catcher_x = max(catcher_h//2, game.catcher_x - 30)
         elif key == GLUT_KEY_RIGHT:
             game.catcher_x = min(width - catcher_h//2, game.catcher_x + 30)
+        request_redraw()
 
 
 def mouse_click(button, state, x, y):
@@ -251,16 +1683,18 @@ def mouse_click(button, state, x, y):
         mouse_y = height - y
         if click_button(mouse_x, mouse_y, 80, height - 60, 40):
             game.restart_game()
+            request_redraw()
         elif click_button(mouse_x, mouse_y, width // 2, height - 60, 40):
             game.paused = not game.paused
+            request_redraw()
         elif click_button(mouse_x, mouse_y, width - 80, height - 60, 40):
             print(f"Goodbye! Final Score: {game.score}")
+            print(f"Frame pacing: {pacer.summary()}")
+            if texture_output:
+                print(f"Texture upload: {screen.summary()}")
             glutLeaveMainLoop()
 
 
-def animate():
-    update()
-
 def init():
     glClearColor(0, 0, 0, 1)
     glPointSize(2)
@@ -274,9 +1708,14 @@ def main():
     glutCreateWindow(b"Catch the Diamonds!")
     init()
     glutDisplayFunc(display)
+    glutKeyboardFunc(keyboard)
     glutSpecialFunc(keyboard_special)
     glutMouseFunc(mouse_click)
-    glutIdleFunc(animate)  
+    glutTimerFunc(0, tick, 0)
     glutMainLoop()
 
-main() 
\ No newline at end of file
+if __name__ == "__main__":
+    if '--bench' in sys.argv:
+        args = sys.argv[sys.argv.index('--bench') + 1:]
+        sys.exit(run_bench(*args[:1]))
+    main()
@@ -1,8 +1,15 @@
 from OpenGL.GL import *
 from OpenGL.GLUT import *
 from OpenGL.GLU import *
+from OpenGL.GL import shaders
 from math import *
-import random
+from fractions import Fraction
+from heapq import heapify, heappop, heappush
+from itertools import takewhile
+import ctypes
+import sys
+import time
+import numpy as np
 
 camera_angle = 0  # Horizontal rotation (degrees)
 camera_height = 500  # Vertical position (z)
@@ -20,6 +27,7 @@ fall_angle = 90
 rotate_speed = 20 
 player_speed = 30  
 gun_length = 70  
+player_size = 50  # width of the footprint obstacles stop
 
 # game
 game_over = False  
@@ -28,22 +36,211 @@ score = 0
 bullet_missed = 0
 
 # bullets
-bullets = []  
-bullet_speed = 0.5  
+class BulletStore:
+    """
+    Bullets as preallocated arrays in the order they were fired. The
+    direction is worked out once in fire(). Dead bullets stay in their
+    slot with alive cleared until compact() packs the live ones to the
+    front, which frees the slots at the end for new bullets.
+    """
+    fields = ('x', 'y', 'z', 'dir_x', 'dir_y', 'angle')
+
+    def __init__(self, capacity=1024):
+        self.count = 0  # slots in use, live or dead
+        self.live = 0
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        for name in self.fields + ('alive',):
+            array = np.zeros(capacity, dtype=bool if name == 'alive' else float)
+            if self.count:
+                array[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, array)
+
+    def __len__(self):
+        return self.live
+
+    def fire(self, x, y, z, angle):
+        if self.count == len(self.x):
+            self.compact()
+            if self.count == len(self.x):
+                self.allocate(2 * len(self.x))
+        i = self.count
+        self.x[i], self.y[i], self.z[i], self.angle[i] = x, y, z, angle
+        self.dir_x[i] = sin(radians(angle))
+        self.dir_y[i] = cos(radians(angle))
+        self.alive[i] = True
+        self.count += 1
+        self.live += 1
+
+    def move(self, speed):
+        n = self.count
+        self.x[:n] += speed * self.dir_x[:n]
+        self.y[:n] += speed * self.dir_y[:n]
+
+    def remove_outside(self, limit):
+        # kills the live bullets past the grid on either axis, returns how many
+        n = self.count
+        return self.remove((np.abs(self.x[:n]) > limit) | (np.abs(self.y[:n]) > limit))
+
+    def remove(self, out):
+        # kills the live bullets marked in out, one flag per used slot,
+        # returns how many
+        out = out & self.alive[:self.count]
+        removed = int(np.count_nonzero(out))
+        if removed:
+            self.alive[:self.count] &= ~out
+            self.live -= removed
+        return removed
+
+    def kill(self, i):
+        self.alive[i] = False
+        self.live -= 1
+
+    def positions(self, lag=0.0):
+        # x, y, z and angle of the live bullets, drawn lag units back
+        # along their path
+        keep = self.alive[:self.count]
+        x, y, z, angle = (getattr(self, name)[:self.count][keep] for name in ('x', 'y', 'z', 'angle'))
+        if lag:
+            x = x - lag * self.dir_x[:self.count][keep]
+            y = y - lag * self.dir_y[:self.count][keep]
+        return [x, y, z, angle]
+
+    def compact(self, slack=0.25):
+        # packs the live bullets to the front in order once more than
+        # slack of the used slots are dead
+        n = self.count
+        if n - self.live <= slack * n:
+            return
+        keep = np.flatnonzero(self.alive[:n])
+        for name in self.fields:
+            array = getattr(self, name)
+            array[:self.live] = array[keep]
+        self.alive[:self.live] = True
+        self.alive[self.live:n] = False
+        self.count = self.live
+
+    def clear(self):
+        self.alive[:self.count] = False
+        self.count = 0
+        self.live = 0
+
+bullets = BulletStore()
+hit_pairs = 1 << 20  # about how many candidate pairs are made at once
+bullet_speed = 500  # units per second
 bullet_height = 100  
 bullet_pos = player_pos  
 bullet_angle = player_angle  
+shot_line = None  # x0, y0, x1, y1, z of the last hitscan shot
+shot_time = 0.1  # seconds a hitscan shot stays on screen
+shot_left = 0.0
 
 #mode
 cheat= False
 first_person = False  
 gun_follow_camera = False
+swarm_mode = False
+hitscan = False
+cheat_target = False  # t makes cheat mode turn to the nearest enemy instead of sweeping
+instanced = True  # draw all enemies, and all bullets, in one call each
+obstacles_on = False
 
 # enemy
-enemy_pos = []
-enemy_speed = 0.08
+class EnemySwarm:
+    """
+    Enemies as arrays, steered and checked against the player all at
+    once. Spawn points are drawn from the generator a batch at a time
+    and handed out as enemies need them. last_x and last_y hold where
+    each enemy was a tick ago so frames can be drawn between ticks.
+    """
+    def __init__(self, batch=1024):
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+        self.z = np.zeros(0)
+        self.last_x = np.zeros(0)
+        self.last_y = np.zeros(0)
+        self.rng = np.random.default_rng()
+        self.batch = batch
+        self.spawns = np.zeros((0, 2))
+
+    def __len__(self):
+        return len(self.x)
+
+    def spawn_points(self, n):
+        # n random points well inside the walls as an (n, 2) array. Ones
+        # within enemy_area + 50 of the player on both axes could touch it
+        # at once, so they are dropped and drawn again.
+        px, py, _ = player_pos
+        near = enemy_area + 50
+        points = np.zeros((0, 2))
+        while len(points) < n:
+            wanted = n - len(points)
+            if wanted > len(self.spawns):
+                edge = GRID_LENGTH - 50
+                fresh = self.rng.integers(-edge, edge, size=(max(wanted, self.batch), 2), endpoint=True)
+                self.spawns = np.concatenate([self.spawns, fresh])
+            taken, self.spawns = self.spawns[:wanted], self.spawns[wanted:]
+            far = (np.abs(taken[:, 0] - px) >= near) | (np.abs(taken[:, 1] - py) >= near)
+            points = np.concatenate([points, taken[far]])
+        return points
+
+    def resize(self, count):
+        # drops enemies from the end or spawns new ones there
+        n = min(count, len(self))
+        points = self.spawn_points(count - n)
+        self.x = np.concatenate([self.x[:n], points[:, 0]])
+        self.y = np.concatenate([self.y[:n], points[:, 1]])
+        self.z = np.concatenate([self.z[:n], np.full(count - n, 50.0)])
+        self.last_x = np.concatenate([self.last_x[:n], points[:, 0]])
+        self.last_y = np.concatenate([self.last_y[:n], points[:, 1]])
+
+    def respawn(self, i):
+        # i is one index or an array of them
+        points = self.spawn_points(np.size(i)).reshape(np.shape(i) + (2,))
+        self.x[i] = self.last_x[i] = points[..., 0]
+        self.y[i] = self.last_y[i] = points[..., 1]
+        self.z[i] = 50
+
+    def steer(self, px, py, speed):
+        # moves every enemy toward the player, except the ones within 30
+        # units of it so they don't shake on the spot
+        self.last_x[:] = self.x
+        self.last_y[:] = self.y
+        dx = px - self.x
+        dy = py - self.y
+        dist = np.sqrt(dx*dx + dy*dy)
+        far = dist > 30
+        self.x[far] += speed * dx[far] / dist[far]
+        self.y[far] += speed * dy[far] / dist[far]
+
+    def positions(self, alpha=1.0):
+        # x, y, z alpha of the way from last tick to this one
+        x = self.last_x + alpha * (self.x - self.last_x)
+        y = self.last_y + alpha * (self.y - self.last_y)
+        return x, y, self.z
+
+    def touching(self, px, py, size):
+        # indices of the enemies whose box overlaps the player's
+        return np.flatnonzero(boxes_collide(px, py, size, self.x, self.y, enemy_area))
+
+    def clear(self):
+        self.resize(0)
+
+enemies = EnemySwarm()
+enemy_count = 5
+swarm_size = 2000  # enemies kept in swarm mode
+enemy_speed = 80  # units per second
 enemy_area = 100
 time_pass = 0
+pulse_speed = 4  # time_pass per second
+
+# clock
+target_fps = 60
+sim_dt = 1 / 60  # fixed simulation step in seconds
+max_frame_time = 0.25  # most time one tick will catch up on
+time_scale = 1.0  # game seconds per real second
+cheat_spin = 300  # degrees per second cheat mode turns the player
 
 
 def draw_text(x, y, text, font=GLUT_BITMAP_HELVETICA_18):
@@ -143,13 +340,19 @@ def drawPlayer():
 
 
 def drawEnemies():
-    global enemy_pos, enemy_speed, time_pass
+    global enemies, enemy_speed, time_pass
     
     scale = 1 + 0.07 * sin(time_pass) # Oscillates between 0.93 and 1.07 (less pronounced)
 
-    for enemy in enemy_pos:
+    x, y, z = enemies.positions(tick_alpha)
+    if instanced:
+        body = InstancedMesh.rows(x, y, z, enemy_area * scale, color=(1, 0, 0))
+        head = InstancedMesh.rows(x, y, z + 75 * scale, enemy_area // 2 * scale)
+        # body then head of each enemy, the order the loop below draws them in
+        if spheres.draw(np.stack([body, head], axis=1).reshape(-1, 8)):
+            return
+    for x, y, z in zip(x.tolist(), y.tolist(), z.tolist()):
         glPushMatrix() 
-        x, y, z = enemy['position']  
         glTranslatef(x, y, z)  
         glScalef(scale, scale, scale)  
         glColor3f(1, 0, 0)  
@@ -164,31 +367,154 @@ def drawEnemies():
 def drawBullets():
     global bullets
     # Draw each bullet
-    for i in bullets:
+    lag = (1 - tick_alpha) * bullet_speed * sim_dt
+    x, y, z, angle = bullets.positions(lag)
+    if instanced and cubes.draw(InstancedMesh.rows(x, y, z, 10, angle)):
+        return
+    for x, y, z, angle in zip(x.tolist(), y.tolist(), z.tolist(), angle.tolist()):
         glPushMatrix()
-        glTranslatef(i[0], i[1], i[2])
-        glRotatef(i[3], 0, 0, 1)  
+        glTranslatef(x, y, z)
+        glRotatef(angle, 0, 0, 1)  
         glColor3f(0, 0, 0)  
         glutSolidCube(10)  
         glPopMatrix()
 
 
+def sphere_triangles(slices, stacks):
+    # the points glutSolidSphere puts on a sphere of radius 1, as triangles
+    turn = -2 * np.pi * np.arange(slices + 1) / slices
+    tilt = np.pi * np.arange(stacks + 1)[:, None] / stacks
+    points = np.stack(np.broadcast_arrays(np.sin(tilt) * np.cos(turn), np.sin(tilt) * np.sin(turn), np.cos(tilt)), axis=-1)
+    a, b, c, d = points[:-1, :-1], points[:-1, 1:], points[1:, :-1], points[1:, 1:]
+    return np.stack([a, c, b, b, c, d], axis=2).reshape(-1, 3)
+
+
+def cube_triangles():
+    # a cube of side 1 around the origin, like glutSolidCube(1)
+    corners = (np.arange(8)[:, None] >> np.array([2, 1, 0]) & 1) - 0.5
+    faces = np.array([(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1), (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)])
+    return corners[faces[:, [0, 1, 2, 0, 2, 3]]].reshape(-1, 3)
+
+
+class InstancedMesh:
+    """
+    One mesh drawn any number of times in a single call. The mesh goes
+    in a vertex buffer once; each frame a row of x, y, z, scale, angle
+    and r, g, b per copy is streamed into a second buffer that the
+    shader reads once per instance. draw() returns False when the GL has
+    no shaders or instancing, so the caller can fall back to GLUT.
+    """
+    vertex_shader = """
+        #version 120
+        attribute vec4 place;  // x, y, z, scale
+        attribute float angle;  // degrees about z
+        attribute vec3 color;
+        varying vec3 shade;
+        void main() {
+            float c = cos(radians(angle)), s = sin(radians(angle));
+            vec3 p = gl_Vertex.xyz * place.w;
+            p.xy = vec2(c * p.x - s * p.y, s * p.x + c * p.y);
+            gl_Position = gl_ModelViewProjectionMatrix * vec4(p + place.xyz, 1.0);
+            shade = color;
+        }
+    """
+    fragment_shader = """
+        #version 120
+        varying vec3 shade;
+        void main() {
+            gl_FragColor = vec4(shade, 1.0);
+        }
+    """
+    fields = (('place', 4), ('angle', 1), ('color', 3))
+    program = None  # shared by every mesh, 0 if this GL can't run it
+    locations = ()
+
+    def __init__(self, triangles):
+        self.triangles = np.ascontiguousarray(triangles, dtype=np.float32)
+        self.mesh = None
+        self.instances = None
+
+    @staticmethod
+    def rows(x, y, z, scale, angle=0, color=(0, 0, 0)):
+        rows = np.empty((len(x), 8), dtype=np.float32)
+        rows[:, 0], rows[:, 1], rows[:, 2], rows[:, 3], rows[:, 4] = x, y, z, scale, angle
+        rows[:, 5:] = color
+        return rows
+
+    @classmethod
+    def compile(cls):
+        cls.program = 0
+        if not (bool(glDrawArraysInstanced) and bool(glVertexAttribDivisor)):
+            return
+        try:
+            cls.program = shaders.compileProgram(
+                shaders.compileShader(cls.vertex_shader, GL_VERTEX_SHADER),
+                shaders.compileShader(cls.fragment_shader, GL_FRAGMENT_SHADER))
+        except (RuntimeError, GLError):
+            return
+        cls.locations = [glGetAttribLocation(cls.program, name) for name, _ in cls.fields]
+
+    def build(self):
+        self.mesh = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.mesh)
+        glBufferData(GL_ARRAY_BUFFER, self.triangles, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.instances = glGenBuffers(1)
+
+    def draw(self, rows):
+        if InstancedMesh.program is None:
+            InstancedMesh.compile()
+        if not InstancedMesh.program:
+            return False
+        if self.mesh is None:
+            self.build()
+        if not len(rows):
+            return True
+        glUseProgram(self.program)
+        glBindBuffer(GL_ARRAY_BUFFER, self.mesh)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(3, GL_FLOAT, 0, ctypes.c_void_p(0))
+        glBindBuffer(GL_ARRAY_BUFFER, self.instances)
+        glBufferData(GL_ARRAY_BUFFER, rows, GL_STREAM_DRAW)
+        offset = 0
+        for location, (_, size) in zip(self.locations, self.fields):
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, size, GL_FLOAT, GL_FALSE, rows.strides[0], ctypes.c_void_p(offset))
+            glVertexAttribDivisor(location, 1)
+            offset += size * 4
+        glDrawArraysInstanced(GL_TRIANGLES, 0, len(self.triangles), len(rows))
+        for location in self.locations:
+            glVertexAttribDivisor(location, 0)
+            glDisableVertexAttribArray(location)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glUseProgram(0)
+        return True
+
+spheres = InstancedMesh(sphere_triangles(10, 10))
+cubes = InstancedMesh(cube_triangles())
+
+
 def spawn_enemy():
-    x = random.randint(-GRID_LENGTH + 50, GRID_LENGTH - 50)
-    y = random.randint(-GRID_LENGTH + 50, GRID_LENGTH - 50)
-    z = 50  # Fixed height for enemies
-    enemy_pos.append((x, y, z))
+    enemies.resize(len(enemies) + 1)
 
 
 def initialize_enemies():
 
-    global enemy_pos
-    enemy_pos.clear()
-    for _ in range(5):
-        x = random.randint(-GRID_LENGTH + 50, GRID_LENGTH - 50)
-        y = random.randint(-GRID_LENGTH + 50, GRID_LENGTH - 50)
-        z = 50
-        enemy_pos.append({'position': [x, y, z]})
+    global enemies
+    enemies.clear()
+    enemies.resize(swarm_size if swarm_mode else enemy_count)
+
+
+def drawShot():
+    # the path of the last hitscan shot, for a moment after it
+    if shot_left > 0 and shot_line is not None:
+        x0, y0, x1, y1, z = shot_line
+        glColor3f(1, 1, 0)
+        glBegin(GL_LINES)
+        glVertex3f(x0, y0, z)
+        glVertex3f(x1, y1, z)
+        glEnd()
 
 
 def draw_shapes():
@@ -198,6 +524,7 @@ def draw_shapes():
         drawPlayer()
         drawBullets()
         drawEnemies()
+        drawShot()
 
 
 class AABB:
@@ -213,6 +540,165 @@ def has_collided(box1, box2):
             box1.y < box2.y + box2.height and
             box1.y + box1.height > box2.y)
 
+def boxes_collide(x1, y1, size1, x2, y2, size2):
+    # has_collided() for arrays of square boxes
+    return (x1 < x2 + size2) & (x1 + size1 > x2) & (y1 < y2 + size2) & (y1 + size1 > y2)
+
+
+class UniformGrid:
+    """
+    Boxes bucketed into every square cell of the arena they overlap, so
+    all the boxes a point can be in are listed under the point's own cell.
+    """
+    def __init__(self, cell, limit=GRID_LENGTH):
+        self.cell = cell
+        self.limit = limit
+        self.side = int(ceil(2 * limit / cell)) + 1
+        self.scale = 1 / cell  # multiplying is quicker than dividing
+
+    def cells(self, x, y):
+        # points past the edge go in the edge cells
+        cx = ((np.asarray(x) + self.limit) * self.scale).astype(np.int32)
+        cy = ((np.asarray(y) + self.limit) * self.scale).astype(np.int32)
+        return np.clip(cx, 0, self.side - 1, out=cx), np.clip(cy, 0, self.side - 1, out=cy)
+
+    def build(self, x0, y0, x1, y1):
+        # boxes from corner x0, y0 to corner x1, y1
+        cx0, cy0 = self.cells(x0, y0)
+        cx1, cy1 = self.cells(x1, y1)
+        across = cx1 - cx0 + 1
+        counts = across * (cy1 - cy0 + 1)
+        item = np.repeat(np.arange(len(counts)), counts)
+        i = np.arange(len(item)) - np.repeat(np.cumsum(counts) - counts, counts)
+        ids = (cy0[item] + i // across[item]) * self.side + cx0[item] + i % across[item]
+        if self.side * self.side <= np.iinfo(np.int16).max:
+            ids = ids.astype(np.int16)  # stable sorts of int16 are radix sorts
+        self.items = item[np.argsort(ids, kind='stable')]
+        # items of cell c are self.items[starts[c]:starts[c + 1]]
+        self.starts = np.zeros(self.side * self.side + 1, dtype=int)
+        np.cumsum(np.bincount(ids, minlength=self.side * self.side), out=self.starts[1:])
+        self.sizes = np.diff(self.starts)
+
+    def near(self, x, y):
+        # (point, item) pairs for every item in the cell of each point
+        cx, cy = self.cells(x, y)
+        ids = cy * self.side + cx
+        found = np.flatnonzero(self.sizes.take(ids))  # most points land in empty cells
+        ids = ids[found]
+        counts = self.sizes.take(ids)
+        point = np.repeat(found, counts)
+        i = np.arange(len(point)) - np.repeat(np.cumsum(counts) - counts - self.starts[ids], counts)
+        return point, self.items[i]
+
+    def near_box(self, x0, y0, x1, y1):
+        # items in the cells one box overlaps
+        cx0, cy0 = (int(min(max((v + self.limit) * self.scale, 0), self.side - 1)) for v in (x0, y0))
+        cx1, cy1 = (int(min(max((v + self.limit) * self.scale, 0), self.side - 1)) for v in (x1, y1))
+        parts = [self.items[self.starts[row * self.side + cx0]:self.starts[row * self.side + cx1 + 1]]
+                 for row in range(cy0, cy1 + 1)]
+        return np.concatenate(parts)
+
+
+class BoxTree:
+    """
+    A bounding volume hierarchy over boxes that never move, built once.
+    The nodes are flat arrays in depth-first order: a node's box is
+    low_x..high_x, low_y..high_y, an inner node's children are the node
+    after it and right, and a leaf holds items[first:first + count].
+    Queries come as arrays and go down the tree together a level at a
+    time, as (query, node) pairs.
+    """
+    leaf_size = 4
+
+    def __init__(self, x0, y0, x1, y1):
+        self.x0, self.y0, self.x1, self.y1 = (np.asarray(v, dtype=float) for v in (x0, y0, x1, y1))
+        # a node's boxes are split at the median centre along the axis
+        # the centres are most spread out on
+        centres = np.stack([self.x0 + self.x1, self.y0 + self.y1])
+        self.items = np.arange(len(self.x0))
+        nodes = []  # low_x, low_y, high_x, high_y, right, first, count
+        stack = [(0, len(self.items), None)] if len(self.items) else []
+        while stack:
+            start, end, parent = stack.pop()
+            if parent is not None:
+                nodes[parent][4] = len(nodes)
+            part = self.items[start:end]
+            nodes.append([self.x0[part].min(), self.y0[part].min(), self.x1[part].max(), self.y1[part].max(),
+                          -1, start, end - start])
+            if end - start > self.leaf_size:
+                nodes[-1][6] = 0
+                spread = centres[:, part]
+                along = spread[int(np.ptp(spread[1]) > np.ptp(spread[0]))]
+                half = (end - start) // 2
+                self.items[start:end] = part[np.argpartition(along, half)]
+                stack.append((start + half, end, len(nodes) - 1))
+                stack.append((start, start + half, None))  # the next node
+        columns = np.array(nodes, dtype=float).reshape(-1, 7).T
+        self.low_x, self.low_y, self.high_x, self.high_y = columns[:4]
+        self.right, self.first, self.count = columns[4:].astype(int)
+
+    def __len__(self):
+        return len(self.items)
+
+    def walk(self, touches, n):
+        # (query, box) pairs of each of n queries and the boxes in every
+        # leaf it reaches, going into the nodes whose boxes
+        # touches(queries, x0, y0, x1, y1) is true for
+        query = np.arange(n) if len(self.count) else np.zeros(0, dtype=int)
+        node = np.zeros(len(query), dtype=int)
+        found, items = [np.zeros(0, dtype=int)], [np.zeros(0, dtype=int)]
+        while len(query):
+            keep = touches(query, self.low_x[node], self.low_y[node], self.high_x[node], self.high_y[node])
+            query, node = query[keep], node[keep]
+            leaf = self.count[node] > 0
+            counts = self.count[node[leaf]]
+            found.append(np.repeat(query[leaf], counts))
+            i = np.arange(len(found[-1])) - np.repeat(np.cumsum(counts) - counts - self.first[node[leaf]], counts)
+            items.append(self.items[i])
+            query, node = query[~leaf], node[~leaf]
+            query = np.concatenate([query, query])
+            node = np.concatenate([node + 1, self.right[node]])
+        return np.concatenate(found), np.concatenate(items)
+
+    def first_hits(self, ax, ay, bx, by):
+        """
+        For each segment from ax, ay to bx, by, how far along it first
+        goes into a box, as a fraction or inf if it never does, and which
+        box that is, or -1.
+        """
+        ax, ay, bx, by = np.broadcast_arrays(*(np.atleast_1d(np.asarray(v, dtype=float)) for v in (ax, ay, bx, by)))
+        with np.errstate(divide='ignore'):
+            over_x, over_y = 1 / (bx - ax), 1 / (by - ay)
+
+        def times(q, x0, y0, x1, y1):
+            return sweep_times(ax[q], ay[q], over_x[q], over_y[q], x0, y0, x1, y1)
+
+        query, item = self.walk(lambda q, *box: times(q, *box) < np.inf, len(ax))
+        t = times(query, self.x0[item], self.y0[item], self.x1[item], self.y1[item])
+        hit = t < np.inf
+        order = np.lexsort((t[hit], query[hit]))
+        t, query, item = t[hit][order], query[hit][order], item[hit][order]
+        first = np.ones(len(query), dtype=bool)  # the earliest of each segment's hits
+        first[1:] = query[1:] != query[:-1]
+        hit_times = np.full(len(ax), np.inf)
+        boxes = np.full(len(ax), -1)
+        hit_times[query[first]], boxes[query[first]] = t[first], item[first]
+        return hit_times, boxes
+
+    def boxes_in(self, x0, y0, x1, y1):
+        """
+        (query, box) pairs for each query box x0..x1, y0..y1 and every box
+        it overlaps.
+        """
+        x0, y0, x1, y1 = np.broadcast_arrays(*(np.atleast_1d(np.asarray(v, dtype=float)) for v in (x0, y0, x1, y1)))
+
+        def overlaps(q, bx0, by0, bx1, by1):
+            return (x0[q] < bx1) & (x1[q] > bx0) & (y0[q] < by1) & (y1[q] > by0)
+
+        query, item = self.walk(overlaps, len(x0))
+        keep = overlaps(query, self.x0[item], self.y0[item], self.x1[item], self.y1[item])
+        return query[keep], item[keep]
+
 
 def fire_bullet():
     global bullets, player_pos, player_angle
@@ -220,68 +706,217 @@ def fire_bullet():
     bx = x + 60 * sin(radians(player_angle))
     by = y + 60 * cos(radians(player_angle))
     bz = z + 50
-    bullets.append([bx, by, bz, player_angle])
+    if hitscan:
+        fire_hitscan(bx, by, bz, player_angle)
+    else:
+        bullets.fire(bx, by, bz, player_angle)
 
 
-def update_bullets_and_enemies():
-    global bullets, enemy_pos, score, bullet_missed, life, game_over, player_pos, player_angle, cheat, time_pass
+def fire_hitscan(x, y, z, angle):
+    """
+    Shoots along angle from the gun to the edge of the grid at once. The
+    bullet's path is tested against every enemy in one go and the
+    nearest one it touches is hit, otherwise it is a miss.
+    """
+    global score, bullet_missed, shot_line, shot_left
+    dx, dy = sin(radians(angle)), cos(radians(angle))
+    # how far the bullet gets before it is past the grid on either axis
+    length = min((copysign(GRID_LENGTH, d) - p) / d if d else inf for p, d in ((x, dx), (y, dy)))
+    length = max(length, 0.0)
+    if obstacles_on and length:
+        # or before the first obstacle in the way
+        blocked, _ = obstacles.first_hits(x, y, x + length * dx, y + length * dy)
+        length *= min(blocked[0], 1.0)
+    hit = None
+    if len(enemies) and length:
+        with np.errstate(divide='ignore'):
+            over_x, over_y = 1 / (length * np.array([dx, dy]))
+        times = sweep_times(x, y, over_x, over_y, enemies.x - 10, enemies.y - 10,
+                            enemies.x + enemy_area, enemies.y + enemy_area)
+        nearest = int(np.argmin(times))
+        if times[nearest] < inf:
+            hit = nearest
+            length *= times[nearest]
+    shot_line = (x, y, x + length * dx, y + length * dy, z)
+    shot_left = shot_time
+    if hit is None:
+        bullet_missed += 1
+    else:
+        score += 1
+        # Respawn enemy
+        enemies.respawn(hit)
+
+
+def sweep_times(x, y, over_x, over_y, x0, y0, x1, y1):
+    # the first fraction of a move at which the point x, y is inside the
+    # open box x0..x1, y0..y1, or inf if it never is. A slab test on each
+    # axis, for arrays. The move is given as one over its length on each
+    # axis, inf if there is none, so a point not moving on an axis is in
+    # the slab from -inf to inf, or never, and nan, a miss, on its edge.
+    with np.errstate(invalid='ignore'):
+        tx0, tx1 = (x0 - x) * over_x, (x1 - x) * over_x
+        ty0, ty1 = (y0 - y) * over_y, (y1 - y) * over_y
+        enter = np.maximum(np.maximum(np.minimum(tx0, tx1), np.minimum(ty0, ty1)), 0.0)
+        leave = np.minimum(np.minimum(np.maximum(tx0, tx1), np.maximum(ty0, ty1)), 1.0)
+    return np.where(enter < leave, enter, np.inf)
+
+
+def bullet_hits(step, until=None):
+    """
+    Yields (bullet slot, enemy index) for each hit during the tick in
+    which every bullet moved step units, and expects the enemy to be
+    respawned before the next one is asked for. A bullet hits the first
+    box its whole path runs into, not just the box it ends up in, so fast
+    bullets can't pass through enemies, and until, if given, is how far
+    along its move each bullet is stopped by something else. Hits come in
+    the order they happen, bullets fired first winning ties, and a
+    respawned enemy can only be hit by the bullets that reach it after
+    that. With no time between them, that is the bullets fired after the
+    one that hit it. Bullets and enemies go through a uniform grid so each
+    bullet only meets the enemies around it.
+    """
+    # A bullet corner in an enemy's box grown by the bullet size, plus a
+    # unit so rounding in cells() can't drop it, touches the enemy. A
+    # bullet that touched an enemy during the tick ended up at most step
+    # further out, and the box grown by that fits in a cell, so it is
+    # listed under at most four cells.
+    grow = 11
+    reach = grow + step
+    cell = enemy_area + 2 * reach
+    ex, ey = enemies.x, enemies.y  # a respawn shows up here too
+    # every used slot, dead bullets are dropped from the pairs. Bullets
+    # moved from sx, sy by vx, vy to bx, by
+    n = bullets.count
+    bx, by = bullets.x[:n], bullets.y[:n]
+    vx, vy = step * bullets.dir_x[:n], step * bullets.dir_y[:n]
+    sx, sy = bx - vx, by - vy
+    with np.errstate(divide='ignore'):
+        over_x, over_y = 1 / vx, 1 / vy
+    alive = bullets.alive[:n]
+    if until is None:
+        until = np.full(n, np.inf)
+    # the grid holds whichever side is smaller, grown toward the other
+    grid = UniformGrid(cell)
+    swap = len(ex) > len(bullets)
+    if swap:
+        grid.build(np.minimum(sx, bx) - enemy_area - 1, np.minimum(sy, by) - enemy_area - 1,
+                   np.maximum(sx, bx) + grow, np.maximum(sy, by) + grow)
+        qx, qy = ex, ey
+    else:
+        grid.build(ex - reach, ey - reach, ex + enemy_area + 1 + step, ey + enemy_area + 1 + step)
+        qx, qy = bx, by
+    chunk = max(1024, hit_pairs * len(grid.sizes) // max(len(grid.items), 1))
+    pairs = []
+    for first in range(0, len(qx), chunk):  # bounds the candidate arrays
+        q, item = grid.near(qx[first:first + chunk], qy[first:first + chunk])
+        q += first
+        b, e = (item, q) if swap else (q, item)
+        b, e = b[alive[b]], e[alive[b]]
+        t = sweep_times(sx[b], sy[b], over_x[b], over_y[b], ex[e] - 10, ey[e] - 10,
+                        ex[e] + enemy_area, ey[e] + enemy_area)
+        touch = t < until[b]
+        pairs.append((t[touch], b[touch], e[touch]))
+    t = np.concatenate([p[0] for p in pairs])
+    b = np.concatenate([p[1] for p in pairs])
+    e = np.concatenate([p[2] for p in pairs])
+    order = np.lexsort((b, t, e))
+    t, b, e = t[order], b[order], e[order]
+    starts = np.searchsorted(e, np.arange(len(ex) + 1))
+    # the (time, bullet) each enemy is hit by in order, its next one in pos
+    targets = {}  # enemy -> its own lists once it has respawned
+    shared = t.tolist(), b.tolist()
+    pos = starts[:-1].tolist()
+    end = starts[1:].tolist()
+    live = bytearray(alive.tobytes())
+    # one (time, bullet, enemy) entry per enemy, the smallest is the next hit
+    touched = np.flatnonzero(starts[1:] > starts[:-1])
+    first = starts[touched]
+    heap = list(zip(t[first].tolist(), b[first].tolist(), touched.tolist()))
+    heapify(heap)
+    bullet_grid = None
+    while heap:
+        t, b, idx = heappop(heap)
+        if live[b]:
+            live[b] = 0
+            bullets.kill(b)
+            yield b, idx
+            if bullet_grid is None:
+                # cells smaller than the box asked for cut the bullets it
+                # is near to, but no smaller than a move or each path is
+                # listed under too many. A bullet may come up more than
+                # once, but it can only be hit once.
+                bullet_grid = UniformGrid(max((enemy_area + 2 * grow) / 2, step))
+                bullet_grid.build(np.minimum(sx, bx), np.minimum(sy, by), np.maximum(sx, bx), np.maximum(sy, by))
+            later = bullet_grid.near_box(ex[idx] - grow, ey[idx] - grow,
+                                         ex[idx] + enemy_area + 1, ey[idx] + enemy_area + 1)
+            times = sweep_times(sx[later], sy[later], over_x[later], over_y[later], ex[idx] - 10, ey[idx] - 10,
+                                ex[idx] + enemy_area, ey[idx] + enemy_area)
+            keep = (times > t) | ((times == t) & (later > b))
+            keep &= times < until[later]
+            times, later = times[keep], later[keep]
+            order = np.lexsort((later, times))
+            targets[idx] = times[order].tolist(), later[order].tolist()
+            pos[idx], end[idx] = 0, len(later)
+        # move on to the enemy's next bullet that is still flying
+        times, candidates = targets.get(idx, shared)
+        p = pos[idx]
+        while p < end[idx] and not live[candidates[p]]:
+            p += 1
+        pos[idx] = p
+        if p < end[idx]:
+            heappush(heap, (times[p], candidates[p], idx))
+
+
+def update_bullets_and_enemies(dt):
+    # advances the game by dt seconds
+    global bullets, enemies, score, bullet_missed, life, game_over, player_pos, player_angle, cheat, time_pass, shot_left
     if game_over:
         return
-    # Move bullets
-    new_bullets = []
-    for b in bullets:
-        bx, by, bz, bangle = b
-        # Move bullet forward
-        bx += bullet_speed * sin(radians(bangle))
-        by += bullet_speed * cos(radians(bangle))
-        # Remove if out of bounds
-        if abs(bx) > GRID_LENGTH or abs(by) > GRID_LENGTH:
-            bullet_missed += 1
-            continue
-        # Check collision with enemies
-        hit = False
-        for idx, enemy in enumerate(enemy_pos):
-            ex, ey, ez = enemy['position']
-            bullet_box = AABB(bx, by, 10, 10)
-            enemy_box = AABB(ex, ey, enemy_area, enemy_area)
-            if has_collided(bullet_box, enemy_box):
-                score += 1
-                # Respawn enemy
-                enemy_pos[idx]['position'] = [random.randint(-GRID_LENGTH+50, GRID_LENGTH-50), random.randint(-GRID_LENGTH+50, GRID_LENGTH-50), 50]
-                hit = True
-                break
-        if not hit:
-            new_bullets.append([bx, by, bz, bangle])
-    bullets = new_bullets
+    shot_left -= dt
+    # Move bullets forward
+    step = bullet_speed * dt
+    bullets.move(step)
+    # how far along the move each bullet runs into an obstacle, if it does
+    blocked = None
+    if obstacles_on and len(bullets):
+        n = bullets.count
+        flying = np.flatnonzero(bullets.alive[:n])
+        bx, by = bullets.x[flying], bullets.y[flying]
+        blocked = np.full(n, np.inf)
+        blocked[flying], _ = obstacles.first_hits(bx - step * bullets.dir_x[flying], by - step * bullets.dir_y[flying], bx, by)
+    # Check collision with enemies along the whole move. Hits are taken in
+    # the order they happen and a hit enemy respawns at once, so the
+    # bullets that get there later are checked against its new position.
+    if len(enemies) and len(bullets):
+        for b, idx in bullet_hits(step, blocked):
+            score += 1
+            # Respawn enemy
+            enemies.respawn(idx)
+    # remove the ones that hit an obstacle or are out of bounds
+    if blocked is not None:
+        bullet_missed += bullets.remove(blocked < np.inf)
+    bullet_missed += bullets.remove_outside(GRID_LENGTH)
+    bullets.compact()
 
     # Move enemies toward player
     px, py, pz = player_pos
-    for enemy in enemy_pos:
-        ex, ey, ez = enemy['position']
-        dx = px - ex
-        dy = py - ey
-        dist = sqrt(dx*dx + dy*dy)
-        # Only move if not too close to player (reduce shaking)
-        if dist > 30:
-            ex += enemy_speed * dx / dist
-            ey += enemy_speed * dy / dist
-        enemy['position'] = [ex, ey, ez]
-        # Shrink/expand effect
-        time_pass += 0.05
-
-        # Check collision with player
-        player_box = AABB(px, py, 50, 50)
-        enemy_box = AABB(ex, ey, enemy_area, enemy_area)
-        if has_collided(player_box, enemy_box):
-            life -= 1
-            # Respawn enemy
-            enemy['position'] = [random.randint(-GRID_LENGTH+50, GRID_LENGTH-50), random.randint(-GRID_LENGTH+50, GRID_LENGTH-50), 50]
-            if life <= 0:
-                game_over = True
-
-    # Always keep 5 enemies
-    while len(enemy_pos) < 5:
-        enemy_pos.append({'position':[random.randint(-GRID_LENGTH+50, GRID_LENGTH-50), random.randint(-GRID_LENGTH+50, GRID_LENGTH-50), 50]})
+    enemies.steer(px, py, enemy_speed * dt)
+    # Shrink/expand effect
+    time_pass += pulse_speed * dt
+
+    # Check collision with player
+    touched = enemies.touching(px, py, 50)
+    if len(touched):
+        life = max(life - len(touched), 0)
+        # Respawn enemy
+        enemies.respawn(touched)
+        if life <= 0:
+            game_over = True
+
+    # Always keep 5 enemies, or a swarm
+    wanted = swarm_size if swarm_mode else enemy_count
+    if len(enemies) != wanted:
+        enemies.resize(wanted)
 
     # Game over if too many missed
     if bullet_missed >= 10:
@@ -289,7 +924,7 @@ def update_bullets_and_enemies():
 
     # Cheat mode: auto rotate and fire
     if cheat and not game_over:
-        cheat_function()
+        cheat_function(dt)
 
  
 def specialKeyListener(key, x, y):
@@ -311,7 +946,7 @@ def specialKeyListener(key, x, y):
 
 
 def keyboardListener(key, x, y):
-    global player_pos, player_angle, cheat, gun_follow_camera, game_over, life, score, bullet_missed, first_person
+    global player_pos, player_angle, cheat, gun_follow_camera, game_over, life, score, bullet_missed, first_person, swarm_mode, hitscan, cheat_target, instanced, obstacles_on, obstacles
     if game_over:
         if key == b'r':
             # Reset game
@@ -320,7 +955,7 @@ def keyboardListener(key, x, y):
             life = 5
             score = 0
             bullet_missed = 0
-            enemy_pos.clear()
+            enemies.clear()
             bullets.clear()
             initialize_enemies()
             game_over = False
@@ -333,6 +968,7 @@ def keyboardListener(key, x, y):
         # Enforce grid boundaries - keep player well inside the grid
         x = max(-GRID_LENGTH+75, min(GRID_LENGTH-75, x))
         y = max(-GRID_LENGTH+75, min(GRID_LENGTH-75, y))
+        x, y = clamp_move(player_pos[0], player_pos[1], x, y)
         player_pos = (x, y, z)
     
     if key == b'w':
@@ -342,6 +978,7 @@ def keyboardListener(key, x, y):
         
         x = max(-GRID_LENGTH+75, min(GRID_LENGTH-75, x))
         y = max(-GRID_LENGTH+75, min(GRID_LENGTH-75, y))
+        x, y = clamp_move(player_pos[0], player_pos[1], x, y)
         player_pos = (x, y, z)
     
     if key == b'a':
@@ -352,6 +989,23 @@ def keyboardListener(key, x, y):
     
     if key == b'c':  
         cheat = not cheat
+
+    if key == b'm':
+        swarm_mode = not swarm_mode
+
+    if key == b'h':
+        hitscan = not hitscan
+
+    if key == b't':
+        cheat_target = not cheat_target
+
+    if key == b'i':
+        instanced = not instanced
+
+    if key == b'o':
+        obstacles_on = not obstacles_on
+        if obstacles is None:
+            obstacles = ObstacleField()
        
     if key == b'v' and cheat:
         first_person = not first_person
@@ -363,15 +1017,44 @@ def keyboardListener(key, x, y):
         restart()
 
 
+def clamp_move(x, y, to_x, to_y):
+    """
+    Where the player gets to going from x, y toward to_x, to_y. The move
+    is made along x and then along y, each stopping against the first
+    obstacle in the way, so the player slides along their sides. An
+    obstacle the player is already in doesn't stop them getting out.
+    """
+    if not obstacles_on:
+        return to_x, to_y
+    half = player_size / 2
+    reach = half + 1  # a unit more so rounding can't drop an obstacle
+    _, near = obstacles.boxes_in(min(x, to_x) - reach, min(y, to_y) - reach, max(x, to_x) + reach, max(y, to_y) + reach)
+    # the obstacles grown by half the player, which is then just a
+    # point, so a player stopped against one is exactly on its edge
+    x0, y0 = obstacles.x0[near] - half, obstacles.y0[near] - half
+    x1, y1 = obstacles.x1[near] + half, obstacles.y1[near] + half
+    level = (y < y1) & (y > y0)
+    if to_x > x:
+        to_x = np.min(x0[level & (x0 >= x)], initial=to_x)
+    else:
+        to_x = np.max(x1[level & (x1 <= x)], initial=to_x)
+    level = (to_x < x1) & (to_x > x0)
+    if to_y > y:
+        to_y = np.min(y0[level & (y0 >= y)], initial=to_y)
+    else:
+        to_y = np.max(y1[level & (y1 <= y)], initial=to_y)
+    return float(to_x), float(to_y)
+
+
 def restart():
-    global player_pos, player_angle, life, score, bullet_missed, enemy_pos, bullets, game_over, cheat
+    global player_pos, player_angle, life, score, bullet_missed, enemies, bullets, game_over, cheat
     cheat = False
     player_pos = (0, 0, 0)
     player_angle = 0
     life = 5
     score = 0
     bullet_missed = 0
-    enemy_pos.clear()
+    enemies.clear()
     bullets.clear()
     initialize_enemies()
     game_over = False
@@ -413,27 +1096,472 @@ def setupCamera():
         gluLookAt(cam_x, cam_y, cam_z, 0, 0, 0, 0, 0, 1)
 
 
-def idle():
+accumulator = 0.0
+last_time = time.perf_counter()
+next_tick = last_time
+tick_alpha = 1.0  # how far the frame is from the last tick to the next
+
+def tick(value):
     """
-    Idle function that runs continuously:
+    Timer function that runs every frame:
+    - Runs as many fixed steps as the time since the last frame covers.
     - Triggers screen redraw for real-time updates.
     """
-    update_bullets_and_enemies()
+    global accumulator, last_time, next_tick, tick_alpha
+    now = time.perf_counter()
+    if game_over:
+        accumulator = 0.0
+    else:
+        accumulator += min(now - last_time, max_frame_time) * time_scale
+    last_time = now
+    while accumulator >= sim_dt:
+        update_bullets_and_enemies(sim_dt)
+        accumulator -= sim_dt
+    tick_alpha = accumulator / sim_dt
     glutPostRedisplay()
+    next_tick += 1 / target_fps
+    if next_tick < now:  # fell behind, start pacing again from now
+        next_tick = now
+    glutTimerFunc(int((next_tick - now) * 1000), tick, 0)
+
 
-def cheat_function():
-    global player_angle, enemy_pos, player_pos
-    player_angle = (player_angle + 5) % 360
+def run_headless(seconds=60, speed=100):
+    """
+    Runs the game without a window in cheat mode for seconds of game
+    time, speed times faster than real time, or as fast as it can if
+    speed is 0, and prints how it went.
+    """
+    global cheat
+    seconds, speed = float(seconds), float(speed)
+    cheat = True
+    ticks = int(seconds / sim_dt)
+    done = 0
+    started = time.perf_counter()
+    while done < ticks and not game_over:
+        update_bullets_and_enemies(sim_dt)
+        done += 1
+        if speed:
+            ahead = started + done * sim_dt / speed - time.perf_counter()
+            if ahead > 0:
+                time.sleep(ahead)
+    took = time.perf_counter() - started
+    played = done * sim_dt
+    print(f"{played:.1f} s of game at {1 / sim_dt:.0f} Hz in {took:.2f} s "
+          f"({played / max(took, 1e-9):.0f}x real time)")
+    print(f"Score: {score}, missed: {bullet_missed}, life: {life}, game over: {game_over}")
+    if obstacles_on:
+        print(f"Obstacles: {len(obstacles)} in a tree built in {obstacles.build_time * 1e3:.2f} ms, "
+              f"{obstacles.queries} queries in {obstacles.query_time * 1e3:.1f} ms "
+              f"({obstacles.query_time * 1e3 / max(done, 1):.3f} ms per tick)")
+    return 0
+
+
+# checks
+# python "22201005_md tasin hadi_03.py" --check [seed]
+# compares sweep_times(), bullet_hits() and BoxTree against brute force
+# on random cases drawn from seed and prints the ones that differ.
+check_cases = 300
+
+def exact_sweep(x, y, vx, vy, x0, y0, x1, y1):
+    # sweep_times() for one move by vx, vy, worked out in fractions
+    enter, leave = Fraction(0), Fraction(1)
+    for p, v, low, high in ((x, vx, x0, x1), (y, vy, y0, y1)):
+        if v == 0:
+            if not low < p < high:
+                return inf
+            continue
+        a, b = Fraction(low - p) / v, Fraction(high - p) / v
+        enter, leave = max(enter, min(a, b)), min(leave, max(a, b))
+    return float(enter) if enter < leave else inf
+
+def check_sweep(rng, failures):
+    # whole numbers and moves that are powers of two, so one over the move
+    # is exact and touching an edge or a corner comes out exactly
+    n = check_cases * 20
+    x, y, x0, y0 = rng.integers(-20, 21, (4, n))
+    x1, y1 = (x0, y0) + rng.integers(0, 20, (2, n))  # some boxes have no inside
+    vx, vy = rng.choice((0, 1, 2, 4, 8, 16, 32), (2, n)) * rng.choice((-1, 1), (2, n))
+    with np.errstate(divide='ignore'):
+        got = sweep_times(x, y, 1 / vx, 1 / vy, x0, y0, x1, y1)
+    for case, t in zip(zip(*(v.tolist() for v in (x, y, vx, vy, x0, y0, x1, y1))), got.tolist()):
+        if exact_sweep(*case) != t:
+            failures.append({'check': 'sweep_times', 'case': case, 'got': t, 'expected': exact_sweep(*case)})
+    return n
+
+def brute_hits(step, until, respawns):
+    # bullet_hits() the slow way, the time of every bullet against every
+    # enemy, with a respawned enemy's column worked out again for the
+    # bullets that reach it after the one that moved it
+    n = bullets.count
+    bx, by = bullets.x[:n, None], bullets.y[:n, None]
+    vx, vy = step * bullets.dir_x[:n, None], step * bullets.dir_y[:n, None]
+    sx, sy = bx - vx, by - vy
+    with np.errstate(divide='ignore'):
+        over_x, over_y = 1 / vx, 1 / vy
+    ex, ey = enemies.x, enemies.y
+    t = sweep_times(sx, sy, over_x, over_y, ex - 10, ey - 10, ex + enemy_area, ey + enemy_area)
+    live = bullets.alive[:n].copy()
+    t[(t >= until[:, None]) | ~live[:, None]] = inf
+    hits = []
+    while t.size:
+        # the smallest time, rows then columns break ties
+        b, e = np.unravel_index(np.argmin(t), t.shape)
+        if t[b, e] == inf:
+            break
+        hits.append((int(b), int(e)))
+        x, y = respawns[len(hits) - 1]
+        column = sweep_times(sx[:, 0], sy[:, 0], over_x[:, 0], over_y[:, 0], x - 10, y - 10, x + enemy_area, y + enemy_area)
+        after = (column > t[b, e]) | ((column == t[b, e]) & (np.arange(n) > b))
+        live[b] = False
+        t[b] = inf
+        t[:, e] = np.where(after & (column < until) & live, column, inf)
+    return hits
+
+def check_hits(rng, failures):
+    # small hit_pairs split the candidates into chunks, and more enemies
+    # than bullets puts the bullets in the grid instead
+    global bullets, enemies, hit_pairs
+    saved = bullets, enemies, hit_pairs
+    try:
+        for case in range(check_cases):
+            spread = rng.choice((150, 300, GRID_LENGTH))
+            bullets, enemies = BulletStore(16), EnemySwarm()
+            hit_pairs = int(rng.choice((64, 1 << 20)))
+            count = int(rng.integers(1, 200))
+            angles = np.where(rng.random(count) < 0.3, rng.integers(0, 8, count) * 45, rng.uniform(0, 360, count))
+            for x, y, angle in zip(*rng.uniform(-spread, spread, (2, count)).tolist(), angles.tolist()):
+                bullets.fire(x, y, bullet_height, angle)
+            for i in np.flatnonzero(rng.random(count) < 0.1).tolist():
+                bullets.kill(i)
+            step = float(rng.choice((1.0, 8.3, 50.0, 125.0)))
+            bullets.move(step)
+            enemies.resize(int(rng.integers(1, 200)))
+            enemies.x[:], enemies.y[:] = rng.uniform(-spread, spread, (2, len(enemies)))
+            respawns = rng.uniform(-spread, spread, (count, 2)).tolist()
+            until = None
+            if case % 2:
+                until = np.where(rng.random(count) < 0.5, rng.random(count), inf)
+            expected = brute_hits(step, np.full(count, inf) if until is None else until, respawns)
+            got = []
+            for b, idx in bullet_hits(step, until):
+                got.append((int(b), int(idx)))
+                enemies.x[idx], enemies.y[idx] = respawns[len(got) - 1]
+            if got != expected:
+                k = next((i for i, (g, e) in enumerate(zip(got, expected)) if g != e), min(len(got), len(expected)))
+                failures.append({'check': 'bullet_hits', 'case': case, 'hit': k,
+                                 'got': got[k:k + 3], 'expected': expected[k:k + 3]})
+    finally:
+        bullets, enemies, hit_pairs = saved
+    return check_cases
+
+def check_tree(rng, failures):
+    # odd cases are on whole numbers, so boxes and queries share edges
+    checks = 0
+    for case in range(check_cases // 3):
+        n = int(rng.choice((0, 1, 3, 5, 40, 300)))
+        x0, y0 = rng.uniform(-1000, 1000, (2, n))
+        x1, y1 = (x0, y0) + rng.uniform(0, 150, (2, n))
+        ax, ay = rng.uniform(-1100, 1100, (2, 50))
+        bx, by = (ax, ay) + rng.uniform(-400, 400, (2, 50))
+        if case % 2:
+            x0, y0, x1, y1, ax, ay, bx, by = (np.round(v) for v in (x0, y0, x1, y1, ax, ay, bx, by))
+        bx[:5], by[:5] = ax[:5], ay[:5]  # not moving
+        by[5:10] = ay[5:10]  # along an axis
+        tree = BoxTree(x0, y0, x1, y1)
+        times, boxes = tree.first_hits(ax, ay, bx, by)
+        with np.errstate(divide='ignore'):
+            over_x, over_y = 1 / (bx - ax), 1 / (by - ay)
+        t = sweep_times(ax[:, None], ay[:, None], over_x[:, None], over_y[:, None], x0, y0, x1, y1)
+        expected = t.min(axis=1, initial=inf)
+        hit = boxes >= 0
+        wrong = (times != expected) | (hit != (expected < inf))
+        wrong[hit] |= t[hit, boxes[hit]] != times[hit]  # ties can be any of the boxes
+        for q in np.flatnonzero(wrong).tolist():
+            failures.append({'check': 'BoxTree.first_hits', 'case': case, 'query': q,
+                             'got': [float(times[q]), int(boxes[q])], 'expected': float(expected[q])})
+        qx0, qy0 = ax, ay
+        qx1, qy1 = np.maximum(ax, bx), np.maximum(ay, by)  # the first five have no inside
+        query, box = tree.boxes_in(qx0, qy0, qx1, qy1)
+        order = np.lexsort((box, query))
+        overlaps = ((qx0[:, None] < x1) & (qx1[:, None] > x0) & (qy0[:, None] < y1) & (qy1[:, None] > y0))
+        if not np.array_equal(np.stack([query[order], box[order]]), np.stack(np.nonzero(overlaps))):
+            failures.append({'check': 'BoxTree.boxes_in', 'case': case, 'got': len(query),
+                             'expected': int(np.count_nonzero(overlaps))})
+        checks += 2 * len(ax)
+    return checks
+
+def run_check(seed=0):
+    """
+    Checks sweep_times(), bullet_hits() and BoxTree against brute force
+    on cases drawn from seed, prints how many differ and returns 1 if
+    any do.
+    """
+    rng = np.random.default_rng(int(seed))
+    failures = []
+    started = time.perf_counter()
+    checks = check_sweep(rng, failures) + check_hits(rng, failures) + check_tree(rng, failures)
+    print(f"{checks} checks, {len(failures)} failures in {time.perf_counter() - started:.1f} s")
+    for failure in failures[:10]:
+        print("  ", failure)
+    return 1 if failures else 0
+
+
+class BearingIndex:
+    """
+    The bearing of every enemy from the player, in player_angle degrees,
+    kept sorted so the enemies in a cone or the one nearest an angle are
+    found by binary search. Enemies move a little each tick, so sorting
+    in last tick's order again is mostly a run the stable sort just
+    walks through.
+    """
+    def __init__(self):
+        self.order = np.zeros(0, dtype=int)  # enemies by bearing
+        self.sorted = np.zeros(0)
+
+    def __len__(self):
+        return len(self.order)
+
+    def update(self, px, py, x, y):
+        bearings = np.degrees(np.arctan2(x - px, y - py))
+        bearings += 360 * (bearings < 0)  # quicker than % 360 on floats
+        if len(self.order) != len(bearings):
+            self.order = np.arange(len(bearings))
+        self.order = self.order[np.argsort(bearings[self.order], kind='stable')]
+        self.sorted = bearings[self.order]
+
+    def in_cone(self, angle, half):
+        # enemies less than half degrees either side of angle
+        start, end = (angle - half) % 360, (angle + half) % 360
+        lo = np.searchsorted(self.sorted, start, side='right')
+        hi = np.searchsorted(self.sorted, end, side='left')
+        if start < end:
+            return self.order[lo:hi]
+        return np.concatenate([self.order[lo:], self.order[:hi]])  # the cone wraps past 0
+
+    def nearest(self, angle, busy=None):
+        # (enemy, signed degrees to turn to it) for the enemy not marked
+        # in busy that needs the least turning from angle, or None. The
+        # nearest free enemy each way round is found by walking out from
+        # angle past the busy ones, which are few.
+        n = len(self.sorted)
+        i = int(np.searchsorted(self.sorted, angle % 360))
+        best = None
+        for j, way in ((i - 1, -1), (i, 1)):
+            for j in range(j, j + way * n, way):
+                enemy = self.order[j % n]
+                if busy is None or not busy[enemy]:
+                    turn = (self.sorted[j % n] - angle + 180) % 360 - 180
+                    if best is None or abs(turn) < abs(best[1]):
+                        best = int(enemy), float(turn)
+                    break
+        return best
+
+aim = BearingIndex()
+aim_wait = np.zeros(0)  # seconds until cheat mode's shot at each enemy gets there
+
+
+def cheat_function(dt):
+    global player_angle, enemies, player_pos, aim_wait
     px, py, _ = player_pos
-    for enemy in enemy_pos:
-        ex, ey, ez = enemy['position']
-        angle_to_enemy = degrees(atan2(ex-px, ey-py)) % 360
-        if abs((player_angle - angle_to_enemy + 180) % 360 - 180) < 10:
+    # bearings to the middle of the box a bullet's corner can hit
+    middle = (enemy_area - 10) / 2
+    aim.update(px, py, enemies.x + middle, enemies.y + middle)
+    spin = cheat_spin * dt
+    if not cheat_target:
+        player_angle = (player_angle + spin) % 360
+        if len(aim.in_cone(player_angle, 10)):
             fire_bullet()
-            break
+        return
+    # leave the enemies bullets are on their way to alone
+    if len(aim_wait) != len(enemies):
+        aim_wait = np.zeros(len(enemies))
+    aim_wait -= dt
+    busy = aim_wait > 0
+    if obstacles_on:
+        # and the ones behind an obstacle
+        hidden, _ = obstacles.first_hits(px, py, enemies.x + middle, enemies.y + middle)
+        busy |= hidden < np.inf
+    target = aim.nearest(player_angle, busy)
+    if target is None:
+        return
+    # turn toward the enemy that needs the least turning, and fire once
+    # facing it. Enemies walk straight at the player, so it stays there.
+    enemy, turn = target
+    player_angle = (player_angle + max(-spin, min(spin, turn))) % 360
+    if abs(turn) <= spin:
+        fire_bullet()
+        if not hitscan:
+            aim_wait[enemy] = hypot(enemies.x[enemy] + middle - px, enemies.y[enemy] + middle - py) / bullet_speed
 
         
 
+class StaticArena:
+    """
+    The floor and walls, which never change, made once on the first
+    frame: the floor as one quad with a checkerboard texture of a texel
+    per tile, and all of it in one vertex buffer. Each frame is then the
+    same few calls however big the grid is.
+    """
+    tile = 100
+    floor_colors = ((1, 1, 1), (0.7, 0.5, 0.95))  # white and pink
+    walls = (  # colour, then two corners along the floor
+        ((0, 1, 1), (-1, -1), (1, -1)),  # Cyan color / top Wall
+        ((1, 0, 0), (-1, 1), (1, 1)),  # red color / bottom Wall
+        ((0, 0, 1), (-1, 1), (-1, -1)),  # Blue color / left Wall
+        ((0, 1, 0), (1, 1), (1, -1)),  # green color / right Wall
+    )
+
+    def __init__(self, limit=GRID_LENGTH, wall_height=100):
+        self.limit = limit
+        self.wall_height = wall_height
+        self.tiles = -(-2 * limit // self.tile)  # the last tile may go past the wall
+        self.texture = None
+        self.buffer = None
+
+    def checkerboard(self):
+        # a texel per tile, white where the tile's x and y numbers add up to
+        # an even number
+        number = (np.arange(self.tiles) * self.tile - self.limit) // self.tile
+        odd = (number[:, None] + number[None, :]) % 2  # [y tile, x tile]
+        colors = np.round(np.array(self.floor_colors) * 255).astype(np.uint8)
+        return np.ascontiguousarray(colors[odd])
+
+    def vertices(self):
+        # x, y, z, r, g, b, s, t of the floor quad then the wall quads
+        low, high, h = -self.limit, self.tiles * self.tile - self.limit, self.wall_height
+        rows = [(low, low, 0, 1, 1, 1, 0, 0), (high, low, 0, 1, 1, 1, 1, 0),
+                (high, high, 0, 1, 1, 1, 1, 1), (low, high, 0, 1, 1, 1, 0, 1)]
+        for color, (x0, y0), (x1, y1) in self.walls:
+            x0, y0, x1, y1 = (v * self.limit for v in (x0, y0, x1, y1))
+            rows += [(x, y, z) + color + (0, 0) for x, y, z in
+                     ((x0, y0, 0), (x1, y1, 0), (x1, y1, h), (x0, y0, h))]
+        return np.array(rows, dtype=np.float32)
+
+    def build(self):
+        self.texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB8, self.tiles, self.tiles, 0,
+                     GL_RGB, GL_UNSIGNED_BYTE, self.checkerboard())
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 4)
+        self.buffer = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        glBufferData(GL_ARRAY_BUFFER, self.vertices(), GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def draw(self):
+        if self.buffer is None:
+            self.build()
+        stride = 8 * 4
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glVertexPointer(3, GL_FLOAT, stride, ctypes.c_void_p(0))
+        glColorPointer(3, GL_FLOAT, stride, ctypes.c_void_p(3 * 4))
+        glTexCoordPointer(2, GL_FLOAT, stride, ctypes.c_void_p(6 * 4))
+        # floor
+        glEnable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_REPLACE)
+        glDrawArrays(GL_QUADS, 0, 4)
+        glDisable(GL_TEXTURE_2D)
+        # walls
+        glDrawArrays(GL_QUADS, 4, 4 * len(self.walls))
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+arena = StaticArena()
+
+
+class ObstacleField:
+    """
+    Pillars and crates on the floor, laid out once from a seed with the
+    middle left clear for the player to start in. All of them are taller
+    than bullets fly, so only their footprints matter to bullets and the
+    player, and those go in a BoxTree. The time spent building it and
+    asking it things is kept for run_headless to report. They are drawn
+    from one static vertex buffer with the depth test on, so the boxes
+    hide each other properly.
+    """
+    kinds = (  # colour, widths, heights
+        ((0.55, 0.55, 0.6), (20, 40), (150, 250)),  # pillar
+        ((0.6, 0.4, 0.2), (30, 60), (60, 100)),  # crate
+    )
+
+    def __init__(self, count=200, seed=7, limit=GRID_LENGTH, clear=150):
+        rng = np.random.default_rng(seed)
+        kind = rng.integers(len(self.kinds), size=count)
+        self.colors, widths, heights = (np.array([k[i] for k in self.kinds])[kind] for i in range(3))
+        self.height = rng.uniform(heights[:, 0], heights[:, 1])
+        width = rng.uniform(widths[:, 0], widths[:, 1])
+        depth = np.where(kind == 0, width, rng.uniform(widths[:, 0], widths[:, 1]))  # pillars are square
+        x, y = np.zeros(count), np.zeros(count)
+        redo = np.ones(count, dtype=bool)
+        while redo.any():
+            x[redo] = rng.uniform(-limit, limit - width[redo])
+            y[redo] = rng.uniform(-limit, limit - depth[redo])
+            redo = (x < clear) & (x + width > -clear) & (y < clear) & (y + depth > -clear)
+        self.x0, self.y0, self.x1, self.y1 = x, y, x + width, y + depth
+        started = time.perf_counter()
+        self.tree = BoxTree(self.x0, self.y0, self.x1, self.y1)
+        self.build_time = time.perf_counter() - started
+        self.query_time = 0.0
+        self.queries = 0
+        self.buffer = None
+
+    def __len__(self):
+        return len(self.x0)
+
+    def first_hits(self, ax, ay, bx, by):
+        started = time.perf_counter()
+        hits = self.tree.first_hits(ax, ay, bx, by)
+        self.query_time += time.perf_counter() - started
+        self.queries += 1
+        return hits
+
+    def boxes_in(self, x0, y0, x1, y1):
+        started = time.perf_counter()
+        pairs = self.tree.boxes_in(x0, y0, x1, y1)
+        self.query_time += time.perf_counter() - started
+        self.queries += 1
+        return pairs
+
+    def vertices(self):
+        # x, y, z, r, g, b of the triangles of every box, each face
+        # shaded a little differently so the boxes read as solid
+        corner = np.stack([self.x0, self.y0, np.zeros(len(self))], axis=1)
+        size = np.stack([self.x1 - self.x0, self.y1 - self.y0, self.height], axis=1)
+        points = corner[:, None] + (cube_triangles() + 0.5) * size[:, None]
+        shade = np.repeat([0.7, 0.7, 0.85, 0.85, 0.5, 1.0], 6)  # x, y, bottom and top faces
+        colors = self.colors[:, None] * shade[:, None]
+        return np.concatenate([points, colors], axis=2).reshape(-1, 6).astype(np.float32)
+
+    def draw(self):
+        if self.buffer is None:
+            self.buffer = glGenBuffers(1)
+            glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+            glBufferData(GL_ARRAY_BUFFER, self.vertices(), GL_STATIC_DRAW)
+        stride = 6 * 4
+        glEnable(GL_DEPTH_TEST)
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(3, GL_FLOAT, stride, ctypes.c_void_p(0))
+        glColorPointer(3, GL_FLOAT, stride, ctypes.c_void_p(3 * 4))
+        glDrawArrays(GL_TRIANGLES, 0, 36 * len(self))
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glDisable(GL_DEPTH_TEST)
+
+obstacles = None  # laid out the first time they are turned on
+
+
 def showScreen():
     """
     Display function to render the game scene:
@@ -447,60 +1575,20 @@ def showScreen():
 
     setupCamera()  # Configure camera perspective
 
-    glBegin(GL_QUADS)
-    for x in range(-GRID_LENGTH, GRID_LENGTH, 100):
-        for y in range(-GRID_LENGTH, GRID_LENGTH, 100):
-            tile_x = (x // 100)
-            tile_y = (y // 100)
-            if (tile_x + tile_y) % 2 == 0:
-                glColor3f(1, 1, 1)      # white
-            else:
-                glColor3f(0.7, 0.5, 0.95)  # pink color
-
-            glVertex3f(x, y, 0)
-            glVertex3f(x + 100, y, 0)
-            glVertex3f(x + 100, y + 100, 0)
-            glVertex3f(x, y + 100, 0)
-    glEnd()
-
-    # Drawing the walls of the game
-    wall_height = 100
-    glBegin(GL_QUADS)
-    
-    # Cyan color / top Wall
-    glColor3f(0, 1, 1)  
-    glVertex3f(-GRID_LENGTH, -GRID_LENGTH, 0)
-    glVertex3f(GRID_LENGTH, -GRID_LENGTH, 0)
-    glVertex3f(GRID_LENGTH, -GRID_LENGTH, wall_height)
-    glVertex3f(-GRID_LENGTH, -GRID_LENGTH, wall_height)
-    
-    # red color / bottom Wall
-    glColor3f(1, 0, 0)  
-    glVertex3f(-GRID_LENGTH, GRID_LENGTH, 0)
-    glVertex3f(GRID_LENGTH, GRID_LENGTH, 0)
-    glVertex3f(GRID_LENGTH, GRID_LENGTH, wall_height)
-    glVertex3f(-GRID_LENGTH, GRID_LENGTH, wall_height)
-    
-    # Blue color / left Wall
-    glColor3f(0, 0, 1)  
-    glVertex3f(-GRID_LENGTH, GRID_LENGTH, 0)
-    glVertex3f(-GRID_LENGTH, -GRID_LENGTH, 0)
-    glVertex3f(-GRID_LENGTH, -GRID_LENGTH, wall_height)
-    glVertex3f(-GRID_LENGTH, GRID_LENGTH, wall_height)
-    
-    # green color / right Wall
-    glColor3f(0, 1, 0)  
-    glVertex3f(GRID_LENGTH, GRID_LENGTH, 0)
-    glVertex3f(GRID_LENGTH, -GRID_LENGTH, 0)
-    glVertex3f(GRID_LENGTH, -GRID_LENGTH, wall_height)
-    glVertex3f(GRID_LENGTH, GRID_LENGTH, wall_height)
-
-    glEnd()
+    arena.draw()  # floor and walls
+    if obstacles_on:
+        obstacles.draw()
     
     # Display game info text at a fixed screen position
     draw_text(10, 770, f"Player Life Remaining: {life}")
     draw_text(10, 740, f"Game Score: {score}")
     draw_text(10, 710, f"Player Bullet Missed: {bullet_missed}")
+    if swarm_mode:
+        draw_text(10, 680, f"Swarm: {len(enemies)} enemies")
+    if hitscan:
+        draw_text(10, 650, "Hitscan")
+    if obstacles_on:
+        draw_text(10, 620, f"Obstacles: {len(obstacles)}")
 
     # Check if the game is over
     if game_over:
@@ -526,9 +1614,22 @@ def main():
     glutKeyboardFunc(keyboardListener)  # Register keyboard listener
     glutSpecialFunc(specialKeyListener)
     glutMouseFunc(mouseListener)
-    glutIdleFunc(idle)  # Register the idle function to move the bullet automatically
+    glutTimerFunc(0, tick, 0)  # Register the timer function to move the bullet automatically
 
     glutMainLoop()  # Enter the GLUT main loop
 
 if __name__ == "__main__":
+    if '--rate' in sys.argv:  # simulation ticks per second
+        sim_dt = 1 / float(sys.argv[sys.argv.index('--rate') + 1])
+    if '--scale' in sys.argv:  # game seconds per real second
+        time_scale = float(sys.argv[sys.argv.index('--scale') + 1])
+    if '--obstacles' in sys.argv:  # how many, laid out from seed 7
+        obstacles = ObstacleField(int(sys.argv[sys.argv.index('--obstacles') + 1]))
+        obstacles_on = True
+    if '--check' in sys.argv:
+        args = sys.argv[sys.argv.index('--check') + 1:]
+        sys.exit(run_check(*takewhile(lambda arg: not arg.startswith('--'), args[:1])))
+    if '--headless' in sys.argv:
+        args = sys.argv[sys.argv.index('--headless') + 1:]
+        sys.exit(run_headless(*takewhile(lambda arg: not arg.startswith('--'), args[:2])))
     main()